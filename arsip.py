@@ -0,0 +1,333 @@
+import os
+import re
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from database import koneksi, path_data
+
+DIR_ARSIP = 'arsip'
+TABEL_TRANSAKSI = ('transaksi_masuk', 'transaksi_keluar')
+# Alokasi lot ikut diarsipkan bersama transaksi keluarnya
+TABEL_ALOKASI = 'alokasi_lot'
+INDEKS_ARSIP = (('tanggal', 'tanggal'),
+                ('produk_tanggal', 'produk_id, tanggal'),
+                ('lokasi_tanggal', 'lokasi_id, tanggal'))
+# Versi arsip (kolom diperbarui) sampai milidetik; dipakai sebagai kunci cadangan arsip
+WAKTU_VERSI = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+# SQLITE_LIMIT_ATTACHED bawaan adalah 10; sisakan ruang untuk ATTACH lain
+MAKS_TAHUN_ARSIP = 8
+
+
+def path_arsip(tahun):
+    return path_data(DIR_ARSIP, f"stok_{tahun}.db")
+
+
+def _alias(tahun):
+    return f"arsip_{int(tahun)}"
+
+
+def batas_bulan(bulan, hari_ini=None):
+    # Tanggal awal bulan, N bulan sebelum bulan berjalan
+    hari_ini = hari_ini or date.today()
+    indeks = hari_ini.year * 12 + hari_ini.month - 1 - bulan
+    return date(indeks // 12, indeks % 12 + 1, 1)
+
+
+def _kolom(conn, tabel, skema='main'):
+    return [r[1] for r in conn.execute(f"PRAGMA {skema}.table_info({tabel})")]
+
+
+def _siapkan_tabel(conn, alias):
+    # Samakan struktur tabel arsip dengan tabel utama (termasuk kolom baru)
+    for tabel in TABEL_TRANSAKSI + (TABEL_ALOKASI,):
+        info = list(conn.execute(f"PRAGMA main.table_info({tabel})"))
+        ada = set(_kolom(conn, tabel, alias))
+        if not ada:
+            definisi = []
+            kunci = [nama for _, nama, _, _, _, pk in sorted(info, key=lambda r: r[5]) if pk]
+            for _, nama, tipe, _, default, pk in info:
+                if pk and len(kunci) == 1:
+                    definisi.append(f"{nama} INTEGER PRIMARY KEY")
+                else:
+                    definisi.append(f"{nama} {tipe}" + (f" DEFAULT {default}" if default is not None else ""))
+            if len(kunci) > 1:
+                definisi.append(f"PRIMARY KEY ({', '.join(kunci)})")
+            conn.execute(f"CREATE TABLE {alias}.{tabel} ({', '.join(definisi)})")
+        else:
+            for _, nama, tipe, _, default, _ in info:
+                if nama not in ada:
+                    conn.execute(f"ALTER TABLE {alias}.{tabel} ADD COLUMN {nama} {tipe}"
+                                 + (f" DEFAULT {default}" if default is not None else ""))
+        if tabel == TABEL_ALOKASI:
+            continue
+        # Indeks yang sama dengan tabel utama, untuk filter periode dan lokasi
+        for nama, kolom in INDEKS_ARSIP:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {alias}.idx_{tabel}_{nama} "
+                         f"ON {tabel}({kolom})")
+
+
+def _pasang(conn, tahun):
+    # ATTACH file arsip tahunan (sekali per koneksi)
+    alias = _alias(tahun)
+    terpasang = {r[1] for r in conn.execute("PRAGMA database_list")}
+    if alias not in terpasang:
+        os.makedirs(path_data(DIR_ARSIP), exist_ok=True)
+        conn.execute("ATTACH DATABASE ? AS " + alias, (path_arsip(tahun),))
+        _siapkan_tabel(conn, alias)
+    return alias
+
+
+def _terpasang(conn):
+    return {r[1] for r in conn.execute("PRAGMA database_list") if r[1].startswith('arsip_')}
+
+
+def _lepas(conn, alias):
+    # DETACH tidak boleh di dalam transaksi; panggil setelah commit
+    conn.execute("DETACH DATABASE " + alias)
+
+
+@contextmanager
+def _sementara(conn, tahun):
+    # Pasang satu arsip selama blok berjalan, lepas lagi bila tadinya belum terpasang
+    pasang_sendiri = _alias(tahun) not in _terpasang(conn)
+    alias = _pasang(conn, tahun)
+    try:
+        yield alias
+    finally:
+        if pasang_sendiri:
+            _lepas(conn, alias)
+
+
+def tahun_arsip(conn, mulai=None, akhir=None):
+    # Tahun arsip yang beririsan dengan rentang [mulai, akhir]
+    query = "SELECT tahun FROM arsip WHERE 1=1"
+    params = []
+    if mulai:
+        query += " AND tahun >= ?"
+        params.append(int(str(mulai)[:4]))
+    if akhir:
+        query += " AND tahun <= ?"
+        params.append(int(str(akhir)[:4]))
+    return [r[0] for r in conn.execute(query + " ORDER BY tahun", params)]
+
+
+def batas_arsip(conn):
+    # Awal bulan pertama yang belum diarsipkan (None bila belum ada arsip)
+    return conn.execute("SELECT MAX(batas) FROM arsip").fetchone()[0]
+
+
+def batasi_rentang(conn, mulai, akhir):
+    # Geser awal rentang agar paling banyak MAKS_TAHUN_ARSIP arsip terbaca;
+    # kembalikan (mulai, True) bila rentang dipotong
+    tahun = tahun_arsip(conn, mulai, akhir)
+    if len(tahun) <= MAKS_TAHUN_ARSIP:
+        return mulai, False
+    return date(tahun[-MAKS_TAHUN_ARSIP], 1, 1), True
+
+
+def sumber(conn, tabel, mulai=None, akhir=None):
+    # Ekspresi FROM untuk tabel transaksi: tabel utama saja, atau
+    # UNION ALL dengan arsip tahunan bila rentang yang diminta memerlukannya
+    tahun = tahun_arsip(conn, mulai, akhir)
+    if not tahun:
+        return tabel
+    if len(tahun) > MAKS_TAHUN_ARSIP:
+        raise ValueError(f"Rentang mencakup {len(tahun)} tahun arsip, "
+                         f"maksimal {MAKS_TAHUN_ARSIP}. Persempit periode.")
+    kolom = ', '.join(_kolom(conn, tabel))
+    bagian = [f"SELECT {kolom} FROM main.{tabel}"]
+    for t in tahun:
+        bagian.append(f"SELECT {kolom} FROM {_pasang(conn, t)}.{tabel}")
+    return "(" + " UNION ALL ".join(bagian) + ")"
+
+
+def _awal_bulan_berikut(bulan):
+    # 'YYYY-MM' -> tanggal awal bulan berikutnya
+    tahun, bln = int(bulan[:4]), int(bulan[5:7])
+    return date(tahun + bln // 12, bln % 12 + 1, 1).isoformat()
+
+
+def perbarui_rekap(conn, mulai=None, akhir=None):
+    # Hitung ulang rekap_bulanan (bulan 'YYYY-MM') dari data utama + arsip,
+    # satu tahun per transaksi agar hanya satu arsip yang terpasang
+    tahun = set(tahun_arsip(conn, mulai, akhir))
+    for tabel in TABEL_TRANSAKSI:
+        tahun.update(int(r[0]) for r in conn.execute(
+            f"SELECT DISTINCT strftime('%Y', tanggal) FROM {tabel}") if r[0])
+    tahun.update(int(r[0]) for r in conn.execute(
+        "SELECT DISTINCT substr(bulan, 1, 4) FROM rekap_bulanan"))
+    bulan_mulai = str(mulai)[:7] if mulai else None
+    bulan_akhir = str(akhir)[:7] if akhir else None
+    baris = 0
+    for t in sorted(tahun):
+        dari = max(f"{t}-01", bulan_mulai or "")
+        sampai = min(f"{t}-12", bulan_akhir or "9999")
+        if dari > sampai:
+            continue
+        rentang = (f"{dari}-01", _awal_bulan_berikut(sampai))
+        terpasang = _terpasang(conn)
+        src_masuk = sumber(conn, 'transaksi_masuk', dari, sampai)
+        src_keluar = sumber(conn, 'transaksi_keluar', dari, sampai)
+        with conn:
+            conn.execute("DELETE FROM rekap_bulanan WHERE bulan >= ? AND bulan <= ?",
+                         (dari, sampai))
+            baris += conn.execute(f'''
+                INSERT INTO rekap_bulanan (produk_id, lokasi_id, bulan, masuk, keluar)
+                SELECT produk_id, lokasi_id, bulan, SUM(masuk), SUM(keluar) FROM (
+                    SELECT produk_id, lokasi_id, strftime('%Y-%m', tanggal) AS bulan,
+                           jumlah AS masuk, 0 AS keluar
+                    FROM {src_masuk} WHERE tanggal >= ? AND tanggal < ?
+                    UNION ALL
+                    SELECT produk_id, lokasi_id, strftime('%Y-%m', tanggal), 0, jumlah
+                    FROM {src_keluar} WHERE tanggal >= ? AND tanggal < ?)
+                GROUP BY produk_id, lokasi_id, bulan
+            ''', rentang + rentang).rowcount
+        for alias in _terpasang(conn) - terpasang:
+            _lepas(conn, alias)
+    return baris
+
+
+def _kecilkan(conn):
+    # Kembalikan halaman bekas baris yang dipindah agar file utama (dan
+    # cadangannya) ikut mengecil. Database lama tanpa auto_vacuum (mode tidak
+    # dapat diubah selama WAL) memakai VACUUM penuh.
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        # executescript menjalankan pragma sampai selesai, execute hanya satu halaman
+        conn.executescript("PRAGMA incremental_vacuum;")
+    else:
+        conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+
+def arsipkan(bulan=12, progres=None):
+    # Pindahkan transaksi yang lebih tua dari N bulan ke file arsip per tahun
+    batas = batas_bulan(bulan).isoformat()
+    conn = koneksi(timeout=30)
+    try:
+        tahun = sorted({
+            int(r[0])
+            for tabel in TABEL_TRANSAKSI
+            for r in conn.execute(
+                f"SELECT DISTINCT strftime('%Y', tanggal) FROM {tabel} WHERE tanggal < ?",
+                (batas,))
+            if r[0]
+        })
+        dipindah = 0
+        for i, t in enumerate(tahun):
+            if progres:
+                progres(i / len(tahun), f"Mengarsipkan tahun {t}...")
+            alias = _pasang(conn, t)
+            rentang = (f"{t}-01-01", min(f"{t + 1}-01-01", batas))
+            # Salin dulu lalu hapus; INSERT OR IGNORE membuat proses aman diulang
+            # bila terhenti di antara commit file arsip dan file utama
+            sebelum = dipindah
+            with conn:
+                # Alokasi lot dipindah sebelum transaksi keluarnya dihapus
+                keluar = ("SELECT id FROM main.transaksi_keluar "
+                          "WHERE tanggal >= ? AND tanggal < ?")
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO {alias}.{TABEL_ALOKASI} (keluar_id, lot_id, jumlah)
+                    SELECT keluar_id, lot_id, jumlah FROM main.{TABEL_ALOKASI}
+                    WHERE keluar_id IN ({keluar})''', rentang)
+                conn.execute(f"DELETE FROM main.{TABEL_ALOKASI} WHERE keluar_id IN ({keluar})",
+                             rentang)
+                for tabel in TABEL_TRANSAKSI:
+                    kolom = ', '.join(_kolom(conn, tabel))
+                    conn.execute(f'''
+                        INSERT OR IGNORE INTO {alias}.{tabel} ({kolom})
+                        SELECT {kolom} FROM main.{tabel}
+                        WHERE tanggal >= ? AND tanggal < ?''', rentang)
+                    dipindah += conn.execute(
+                        f"DELETE FROM main.{tabel} WHERE tanggal >= ? AND tanggal < ?",
+                        rentang).rowcount
+                # Versi arsip hanya berubah bila isinya berubah
+                conn.execute(f'''
+                    INSERT INTO arsip (tahun, path, batas, diperbarui)
+                    VALUES (?, ?, ?, {WAKTU_VERSI})
+                    ON CONFLICT(tahun) DO UPDATE SET
+                        batas = MAX(batas, excluded.batas),
+                        diperbarui = CASE WHEN ? THEN excluded.diperbarui ELSE diperbarui END''',
+                    (t, path_arsip(t), rentang[1], dipindah > sebelum))
+            _lepas(conn, alias)
+            perbarui_rekap(conn, rentang[0],
+                           (date.fromisoformat(rentang[1]) - timedelta(days=1)).isoformat())
+        if dipindah:
+            _kecilkan(conn)
+        return {'tahun': tahun, 'dipindah': dipindah, 'batas': batas}
+    finally:
+        conn.close()
+
+
+def buang_duplikat(conn):
+    # Hapus dari arsip baris yang juga ada di tabel utama, mis. setelah
+    # database dipulihkan dari cadangan yang dibuat sebelum pengarsipan.
+    # Berkas yang tidak tercatat di tabel arsip ikut diperiksa karena
+    # pengarsipan berikutnya akan mendaftarkannya lagi
+    folder = path_data(DIR_ARSIP)
+    berkas = os.listdir(folder) if os.path.isdir(folder) else []
+    tahun = set(tahun_arsip(conn)) | {
+        int(n[5:9]) for n in berkas if re.fullmatch(r"stok_\d{4}\.db", n)}
+    terhapus = 0
+    for tahun in sorted(tahun):
+        with _sementara(conn, tahun) as alias:
+            with conn:
+                sebelum = terhapus
+                for tabel in TABEL_TRANSAKSI:
+                    terhapus += conn.execute(
+                        f"DELETE FROM {alias}.{tabel} WHERE id IN (SELECT id FROM main.{tabel})"
+                    ).rowcount
+                conn.execute(f"DELETE FROM {alias}.{TABEL_ALOKASI} "
+                             f"WHERE keluar_id IN (SELECT id FROM main.transaksi_keluar)")
+                if terhapus > sebelum:
+                    # Isi arsip berubah: cadangan berikutnya menyalinnya lagi
+                    conn.execute(f"UPDATE arsip SET diperbarui = {WAKTU_VERSI} WHERE tahun = ?",
+                                 (tahun,))
+    return terhapus
+
+
+def ringkasan(conn):
+    # Daftar arsip beserta jumlah baris per tabel
+    hasil = []
+    for tahun, path, batas, diperbarui in conn.execute(
+            "SELECT tahun, path, batas, diperbarui FROM arsip ORDER BY tahun").fetchall():
+        # Pasang dan lepas satu per satu agar jumlah arsip tidak dibatasi ATTACH
+        with _sementara(conn, tahun) as alias:
+            baris = {tabel: conn.execute(f"SELECT COUNT(*) FROM {alias}.{tabel}").fetchone()[0]
+                     for tabel in TABEL_TRANSAKSI}
+        hasil.append({'Tahun': tahun, 'Berkas': path, 'Batas': batas,
+                      'Masuk': baris['transaksi_masuk'], 'Keluar': baris['transaksi_keluar'],
+                      'Diperbarui': diperbarui})
+    return hasil
+
+
+def cari(conn, tabel, kolom, nilai):
+    # Baris dengan kolom = nilai dari tabel utama, atau dari arsip tahunan
+    # terbaru yang memuatnya (arsip dipasang satu per satu)
+    query = f"SELECT * FROM {{}}.{tabel} WHERE {kolom} = ?"
+
+    def _baca(skema):
+        cur = conn.execute(query.format(skema), (nilai,))
+        nama = [d[0] for d in cur.description]
+        return [dict(zip(nama, r)) for r in cur]
+
+    hasil = _baca('main')
+    for tahun in reversed(tahun_arsip(conn)):
+        if hasil:
+            break
+        with _sementara(conn, tahun) as alias:
+            hasil = _baca(alias)
+    return hasil
+
+
+def hitung(conn, tabel, lokasi_id=None):
+    # Jumlah transaksi di data utama + seluruh arsip (satu arsip per langkah)
+    query = "SELECT COUNT(*) FROM {}." + tabel
+    params = ()
+    if lokasi_id is not None:
+        query += " WHERE lokasi_id = ?"
+        params = (lokasi_id,)
+    total = conn.execute(query.format('main'), params).fetchone()[0]
+    for tahun in tahun_arsip(conn):
+        with _sementara(conn, tahun) as alias:
+            total += conn.execute(query.format(alias), params).fetchone()[0]
+    return total
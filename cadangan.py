@@ -0,0 +1,343 @@
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import arsip
+import perubahan
+from database import init_db, koneksi, path_data
+
+DIR_CADANGAN = 'cadangan'
+PREFIX = 'stok-'
+EKSTENSI = '.db.gz'
+# File arsip tahunan dicadangkan per versi (arsip.diperbarui); setiap snapshot
+# punya manifest berisi versi arsip yang menyertainya
+DIR_ARSIP = 'arsip'
+MANIFEST = '.arsip.json'
+
+# Salin 256 halaman per langkah lalu jeda, agar penulis tidak tertahan
+HALAMAN_PER_LANGKAH = 256
+JEDA_LANGKAH = 0.05
+# Penulisan dari koneksi lain membuat backup bertahap mulai ulang; setelah
+# beberapa kali, salin sekaligus dalam satu transaksi baca (WAL: tidak memblokir penulis)
+MAKS_ULANG = 3
+
+RETENSI = 7
+INTERVAL_JAM = 24
+# Hasil putaran penjadwal terakhir, ditampilkan di halaman Pemeliharaan
+STATUS_PENJADWAL = 'penjadwal.json'
+
+log = logging.getLogger(__name__)
+
+_kunci = threading.Lock()
+_kunci_penjadwal = threading.Lock()
+_penjadwal = None
+_berhenti = threading.Event()
+
+
+class _TerlaluSeringUlang(Exception):
+    pass
+
+
+def _cek_integritas(path):
+    conn = sqlite3.connect(path)
+    try:
+        hasil = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+    if hasil != 'ok':
+        raise ValueError(f"Cadangan rusak: {hasil}")
+
+
+def _path_manifest(nama):
+    return path_data(DIR_CADANGAN, nama[:-len(EKSTENSI)] + MANIFEST)
+
+
+def _kompres_db(sumber, tujuan):
+    # Salin database lewat backup API, verifikasi, lalu kompres ke tujuan
+    fd, tmp = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(tujuan))
+    os.close(fd)
+    try:
+        src = sqlite3.connect(sumber)
+        dst = sqlite3.connect(tmp)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        _cek_integritas(tmp)
+        with open(tmp, 'rb') as f_in, gzip.open(tujuan + '.tmp', 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.replace(tujuan + '.tmp', tujuan)
+    finally:
+        for path in (tmp, tujuan + '.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _cadangkan_arsip(snapshot):
+    # Cadangkan file arsip yang versinya (menurut tabel arsip di snapshot)
+    # belum punya cadangan; arsip tidak berubah di luar pengarsipan
+    conn = sqlite3.connect(snapshot)
+    try:
+        versi = conn.execute("SELECT tahun, diperbarui FROM arsip ORDER BY tahun").fetchall()
+    finally:
+        conn.close()
+    folder = path_data(DIR_CADANGAN, DIR_ARSIP)
+    os.makedirs(folder, exist_ok=True)
+    hasil = []
+    for tahun, diperbarui in versi:
+        sumber = arsip.path_arsip(tahun)
+        if not os.path.exists(sumber):
+            continue
+        nama = f"stok_{tahun}-{re.sub(r'[^0-9]', '', str(diperbarui))}{EKSTENSI}"
+        if not os.path.exists(os.path.join(folder, nama)):
+            _kompres_db(sumber, os.path.join(folder, nama))
+        hasil.append({'tahun': tahun, 'berkas': nama})
+    return hasil
+
+
+def daftar_cadangan():
+    # Cadangan terbaru lebih dulu
+    folder = path_data(DIR_CADANGAN)
+    if not os.path.isdir(folder):
+        return []
+    hasil = []
+    for nama in os.listdir(folder):
+        if nama.startswith(PREFIX) and nama.endswith(EKSTENSI):
+            info = os.stat(os.path.join(folder, nama))
+            hasil.append({'nama': nama, 'ukuran': info.st_size,
+                          'waktu': datetime.fromtimestamp(info.st_mtime)})
+    return sorted(hasil, key=lambda c: c['nama'], reverse=True)
+
+
+def buat_cadangan(progres=None):
+    # Snapshot online via backup API SQLite, dikompres gzip setelah diverifikasi
+    with _kunci:
+        folder = path_data(DIR_CADANGAN)
+        os.makedirs(folder, exist_ok=True)
+        nama = f"{PREFIX}{datetime.now():%Y%m%d-%H%M%S-%f}{EKSTENSI}"
+        tujuan = os.path.join(folder, nama)
+        fd, tmp = tempfile.mkstemp(suffix='.db', dir=folder)
+        os.close(fd)
+        try:
+            src = koneksi(timeout=30)
+            dst = sqlite3.connect(tmp)
+            try:
+                jejak = {'sisa': None, 'total': 0, 'ulang': 0, 'sekaligus': False}
+
+                # Progres hanya dicatat di memori: progres() tugas menulis ke
+                # database yang sedang disalin dan akan memulai ulang backup
+                def _langkah(status, sisa, total):
+                    if jejak['sisa'] is not None and sisa > jejak['sisa']:
+                        jejak['ulang'] += 1
+                        if jejak['ulang'] >= MAKS_ULANG:
+                            raise _TerlaluSeringUlang()
+                    jejak['sisa'] = sisa
+                    jejak['total'] = total
+                try:
+                    src.backup(dst, pages=HALAMAN_PER_LANGKAH,
+                               progress=_langkah, sleep=JEDA_LANGKAH)
+                except _TerlaluSeringUlang:
+                    jejak['sekaligus'] = True
+                    src.backup(dst)
+            finally:
+                dst.close()
+                src.close()
+
+            if progres:
+                progres(0.85, f"{jejak['total']:,} halaman disalin. Memverifikasi cadangan...")
+            _cek_integritas(tmp)
+
+            if progres:
+                progres(0.9, "Mengompres cadangan...")
+            with open(tmp, 'rb') as f_in, gzip.open(tujuan + '.tmp', 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+
+            if progres:
+                progres(0.95, "Mencadangkan arsip tahunan...")
+            berkas_arsip = _cadangkan_arsip(tmp)
+            with open(_path_manifest(nama), 'w') as f:
+                json.dump(berkas_arsip, f)
+            os.replace(tujuan + '.tmp', tujuan)
+        finally:
+            for path in (tmp, tujuan + '.tmp'):
+                if os.path.exists(path):
+                    os.remove(path)
+        return {'nama': nama, 'ukuran': os.path.getsize(tujuan),
+                'ulang': jejak['ulang'], 'sekaligus': jejak['sekaligus'],
+                'arsip': [a['berkas'] for a in berkas_arsip]}
+
+
+def bersihkan(retensi=RETENSI):
+    # Hapus cadangan lama, sisakan sejumlah retensi terbaru; cadangan arsip
+    # yang tidak lagi dirujuk manifest mana pun ikut dihapus
+    terhapus = []
+    with _kunci:
+        daftar = daftar_cadangan()
+        for c in daftar[retensi:]:
+            os.remove(path_data(DIR_CADANGAN, c['nama']))
+            if os.path.exists(_path_manifest(c['nama'])):
+                os.remove(_path_manifest(c['nama']))
+            terhapus.append(c['nama'])
+        dipakai = {a['berkas'] for c in daftar[:retensi] for a in _baca_manifest(c['nama'])}
+        folder = path_data(DIR_CADANGAN, DIR_ARSIP)
+        for nama in (os.listdir(folder) if os.path.isdir(folder) else []):
+            if nama.endswith(EKSTENSI) and nama not in dipakai:
+                os.remove(os.path.join(folder, nama))
+    return terhapus
+
+
+def _baca_manifest(nama):
+    # Cadangan lama (sebelum arsip ikut dicadangkan) tidak punya manifest
+    path = _path_manifest(nama)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def _siapkan_arsip(nama):
+    # Ekstrak dan verifikasi cadangan arsip yang menyertai snapshot sebelum
+    # database utama disentuh; kembalikan [(tahun, file sementara)]
+    hasil = []
+    try:
+        for a in _baca_manifest(nama):
+            path = path_data(DIR_CADANGAN, DIR_ARSIP, a['berkas'])
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Cadangan arsip tidak ditemukan: {a['berkas']}")
+            fd, tmp = tempfile.mkstemp(suffix='.db', dir=path_data(DIR_CADANGAN))
+            os.close(fd)
+            hasil.append((a['tahun'], tmp))
+            with gzip.open(path, 'rb') as f_in, open(tmp, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            _cek_integritas(tmp)
+    except Exception:
+        for _, tmp in hasil:
+            os.remove(tmp)
+        raise
+    return hasil
+
+
+def _pulihkan_arsip(siap):
+    # Timpa file arsip tahunan dengan versi dari snapshot
+    for tahun, tmp in siap:
+        os.makedirs(os.path.dirname(arsip.path_arsip(tahun)), exist_ok=True)
+        src = sqlite3.connect(tmp)
+        dst = sqlite3.connect(arsip.path_arsip(tahun))
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+
+
+def pulihkan(nama, pengguna=None):
+    # Pulihkan dari cadangan terverifikasi; kondisi saat ini dicadangkan dulu
+    path = path_data(DIR_CADANGAN, os.path.basename(nama))
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Cadangan tidak ditemukan: {nama}")
+
+    fd, tmp = tempfile.mkstemp(suffix='.db', dir=path_data(DIR_CADANGAN))
+    os.close(fd)
+    siap = []
+    try:
+        with gzip.open(path, 'rb') as f_in, open(tmp, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        _cek_integritas(tmp)
+        siap = _siapkan_arsip(nama)
+
+        pengaman = buat_cadangan()
+        with _kunci:
+            src = sqlite3.connect(tmp)
+            dst = koneksi(timeout=30)
+            try:
+                seq_lama = perubahan.seq_terakhir(dst)
+                src.backup(dst)
+                _pulihkan_arsip(siap)
+                # Snapshot lama mungkin belum memiliki tabel terbaru
+                init_db()
+                with dst:
+                    # Tugas yang tercatat aktif di snapshot tidak akan pernah berjalan
+                    dst.execute(
+                        "UPDATE tugas SET status = 'gagal', "
+                        "pesan = 'Dibatalkan oleh pemulihan cadangan' "
+                        "WHERE status IN ('antri', 'berjalan')")
+                    # Log perubahan tidak boleh mundur bagi konsumen
+                    perubahan.lanjutkan_seq(dst, seq_lama)
+                    perubahan.catat(dst, 'database', 'pulihkan', None, {
+                        'cadangan': os.path.basename(nama), 'seq_sebelum': seq_lama}, pengguna)
+                # Snapshot dari sebelum pengarsipan memuat lagi baris yang sudah diarsipkan
+                duplikat = arsip.buang_duplikat(dst)
+            finally:
+                dst.close()
+                src.close()
+    finally:
+        os.remove(tmp)
+        for _, path_arsip in siap:
+            os.remove(path_arsip)
+    return {'dipulihkan': os.path.basename(nama), 'pengaman': pengaman['nama'],
+            'duplikat_arsip': duplikat}
+
+
+def _catat_penjadwal(**data):
+    path = path_data(DIR_CADANGAN, STATUS_PENJADWAL)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    status = status_penjadwal() or {}
+    status.update(data)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(status, f)
+    os.replace(path + '.tmp', path)
+
+
+def status_penjadwal():
+    # {'berhasil': waktu, 'gagal': waktu, 'pesan': error} atau None
+    path = path_data(DIR_CADANGAN, STATUS_PENJADWAL)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _loop_penjadwal(interval_jam, retensi):
+    interval = interval_jam * 3600
+    while not _berhenti.is_set():
+        terbaru = daftar_cadangan()
+        umur = (time.time() - terbaru[0]['waktu'].timestamp()) if terbaru else interval
+        if umur >= interval:
+            try:
+                buat_cadangan()
+                bersihkan(retensi)
+            except Exception as e:
+                # Coba lagi pada putaran berikutnya
+                log.exception("Cadangan terjadwal gagal")
+                _catat_penjadwal(gagal=datetime.now().isoformat(timespec='seconds'),
+                                 pesan=str(e))
+            else:
+                _catat_penjadwal(berhasil=datetime.now().isoformat(timespec='seconds'))
+            umur = 0
+        _berhenti.wait(min(interval - umur, 60))
+
+
+def mulai_penjadwal(interval_jam=INTERVAL_JAM, retensi=RETENSI):
+    # Satu thread penjadwal per proses
+    global _penjadwal
+    with _kunci_penjadwal:
+        if _penjadwal is None or not _penjadwal.is_alive():
+            _berhenti.clear()
+            _penjadwal = threading.Thread(
+                target=_loop_penjadwal, args=(interval_jam, retensi),
+                name="mstock-cadangan", daemon=True)
+            _penjadwal.start()
+    return _penjadwal
+
+
+def hentikan_penjadwal():
+    _berhenti.set()
@@ -1,29 +1,47 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
+import tugas
+import arsip
+from stok import lot_mendekati_kedaluwarsa, pilih_lokasi
+from database import koneksi
 
 
 def main():
     st.header("📊 Dashboard Stok", divider="green")
-    conn = sqlite3.connect('data/stok.db')
+    conn = koneksi()
     c = conn.cursor()
 
+    # Filter Lokasi
+    lokasi_id = pilih_lokasi(conn, key="lokasi_dashboard")
+    filter_lokasi = "" if lokasi_id is None else " WHERE lokasi_id = ?"
+    params_lokasi = () if lokasi_id is None else (lokasi_id,)
+
     # Statistik Utama
     with st.container():
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            produk = c.execute("SELECT COUNT(*) FROM produk").fetchone()[0]
+            if lokasi_id is None:
+                produk = c.execute("SELECT COUNT(*) FROM produk").fetchone()[0]
+            else:
+                produk = c.execute(
+                    "SELECT COUNT(*) FROM stok_lokasi WHERE lokasi_id = ? AND stok > 0",
+                    params_lokasi).fetchone()[0]
             st.metric(
                 "📦 Total Produk",
                 produk,
-                help="Total produk terdaftar",
+                help="Total produk terdaftar (atau yang tersedia di lokasi terpilih)",
                 delta_color="off"
             )
         with col2:
-            stok_total = c.execute(
-                "SELECT SUM(stok) FROM produk").fetchone()[0] or 0
+            if lokasi_id is None:
+                stok_total = c.execute(
+                    "SELECT SUM(stok) FROM produk").fetchone()[0] or 0
+            else:
+                stok_total = c.execute(
+                    "SELECT SUM(stok) FROM stok_lokasi WHERE lokasi_id = ?",
+                    params_lokasi).fetchone()[0] or 0
             st.metric(
                 "📈 Total Stok",
                 f"{stok_total:,}",
@@ -31,27 +49,33 @@ def main():
                 delta_color="off"
             )
         with col3:
-            transaksi_masuk = c.execute(
-                "SELECT COUNT(*) FROM transaksi_masuk").fetchone()[0]
+            transaksi_masuk = arsip.hitung(conn, 'transaksi_masuk', lokasi_id)
             st.metric(
                 "📥 Transaksi Masuk",
                 transaksi_masuk,
-                help="Total transaksi masuk",
+                help="Total transaksi masuk, termasuk yang sudah diarsipkan",
                 delta_color="off"
             )
         with col4:
-            transaksi_keluar = c.execute(
-                "SELECT COUNT(*) FROM transaksi_keluar").fetchone()[0]
+            transaksi_keluar = arsip.hitung(conn, 'transaksi_keluar', lokasi_id)
             st.metric(
                 "📤 Transaksi Keluar",
                 transaksi_keluar,
-                help="Total transaksi keluar",
+                help="Total transaksi keluar, termasuk yang sudah diarsipkan",
                 delta_color="off"
             )
 
     # Grafik Stok Produk
     st.subheader("📌 Stok Produk Terakhir")
-    df_produk = pd.read_sql_query("SELECT nama, stok FROM produk", conn)
+    if lokasi_id is None:
+        df_produk = pd.read_sql_query("SELECT nama, stok FROM produk", conn)
+    else:
+        df_produk = pd.read_sql_query('''
+            SELECT p.nama, sl.stok
+            FROM stok_lokasi sl
+            JOIN produk p ON sl.produk_id = p.id
+            WHERE sl.lokasi_id = ?
+        ''', conn, params=params_lokasi)
 
     fig = px.bar(
         df_produk,
@@ -69,22 +93,91 @@ def main():
     )
     st.plotly_chart(fig, use_container_width=True)
 
+    # Tren Bulanan (dari tabel rekap, dibangun ulang di latar belakang)
+    col_judul, col_rekap = st.columns([3, 1])
+    with col_judul:
+        st.subheader("📆 Tren Transaksi Bulanan")
+    with col_rekap:
+        if st.button("🔄 Perbarui Rekap", help="Hitung ulang rekap bulanan dari semua transaksi"):
+            st.session_state.tugas_rekap = tugas.kirim('rekap_bulanan')
+    tugas_rekap = st.session_state.get('tugas_rekap')
+    info = tugas.status(tugas_rekap) if tugas_rekap else None
+    if info and info['status'] in tugas.STATUS_AKTIF:
+        tugas.pantau(tugas_rekap)
+
+    df_rekap = pd.read_sql_query(f'''
+        SELECT bulan AS Bulan, SUM(masuk) AS Masuk, SUM(keluar) AS Keluar
+        FROM rekap_bulanan{filter_lokasi}
+        GROUP BY bulan
+        ORDER BY bulan
+    ''', conn, params=params_lokasi)
+    if df_rekap.empty:
+        st.info("Rekap bulanan belum tersedia. Klik 'Perbarui Rekap'.", icon="ℹ️")
+    else:
+        fig_rekap = px.line(
+            df_rekap,
+            x='Bulan', y=['Masuk', 'Keluar'],
+            template='plotly_white',
+            color_discrete_sequence=['#2ECC71', '#E74C3C']
+        )
+        fig_rekap.update_layout(
+            margin=dict(l=20, r=20, t=20, b=20),
+            xaxis_title=None,
+            yaxis_title=None,
+            legend_title=None
+        )
+        st.plotly_chart(fig_rekap, use_container_width=True)
+
+    # Batch Mendekati Kedaluwarsa
+    col_judul_exp, col_hari = st.columns([3, 1])
+    with col_judul_exp:
+        st.subheader("⏳ Batch Mendekati Kedaluwarsa")
+    with col_hari:
+        hari = st.number_input(
+            "Dalam (hari)",
+            min_value=0,
+            value=30,
+            step=1,
+            key="hari_kedaluwarsa",
+            help="Tampilkan batch yang kedaluwarsa dalam rentang ini"
+        )
+    df_exp = pd.DataFrame(
+        lot_mendekati_kedaluwarsa(conn, hari, lokasi_id),
+        columns=['ID', 'Produk', 'Lokasi', 'Batch', 'Kedaluwarsa', 'Sisa', 'Satuan'])
+    if df_exp.empty:
+        st.info(f"Tidak ada batch yang kedaluwarsa dalam {hari} hari.", icon="✅")
+    else:
+        kedaluwarsa = pd.to_datetime(df_exp['Kedaluwarsa'])
+        df_exp['Sisa Hari'] = (kedaluwarsa - pd.Timestamp(datetime.now().date())).dt.days
+        df_exp['Kedaluwarsa'] = kedaluwarsa.dt.strftime('%d-%m-%Y')
+        df_exp['Batch'] = df_exp['Batch'].fillna('-')
+        st.dataframe(
+            df_exp.drop(columns='ID').style
+                .format({'Sisa': '{:,}'})
+                .map(lambda v: 'color: #E74C3C' if v < 0 else '', subset=['Sisa Hari']),
+            use_container_width=True,
+            hide_index=True
+        )
+        st.caption("Sisa hari negatif berarti batch sudah kedaluwarsa.")
+
     # Riwayat Transaksi
     st.subheader("📚 Riwayat Transaksi")
+    st.caption("Dari data aktif; transaksi yang diarsipkan ada di halaman Transaksi Masuk/Keluar.")
     col_masuk, col_keluar = st.columns(2)
 
     with col_masuk:
         st.write("5 Transaksi Masuk Terakhir")
-        df_masuk = pd.read_sql_query('''
+        df_masuk = pd.read_sql_query(f'''
             SELECT 
                 p.nama AS Produk, 
                 tm.jumlah AS Jumlah, 
                 strftime('%d-%m-%Y', tm.tanggal) AS Tanggal 
             FROM transaksi_masuk tm
             JOIN produk p ON tm.produk_id = p.id
+            {filter_lokasi}
             ORDER BY tm.tanggal DESC
             LIMIT 5
-        ''', conn)
+        ''', conn, params=params_lokasi)
         st.dataframe(
             df_masuk.style.format({'Jumlah': '{:,}'}),
             use_container_width=True,
@@ -93,16 +186,17 @@ def main():
 
     with col_keluar:
         st.write("5 Transaksi Keluar Terakhir")
-        df_keluar = pd.read_sql_query('''
+        df_keluar = pd.read_sql_query(f'''
             SELECT 
                 p.nama AS Produk, 
                 tk.jumlah AS Jumlah, 
                 strftime('%d-%m-%Y', tk.tanggal) AS Tanggal 
             FROM transaksi_keluar tk
             JOIN produk p ON tk.produk_id = p.id
+            {filter_lokasi}
             ORDER BY tk.tanggal DESC
             LIMIT 5
-        ''', conn)
+        ''', conn, params=params_lokasi)
         st.dataframe(
             df_keluar.style.format({'Jumlah': '{:,}'}),
             use_container_width=True,
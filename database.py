@@ -1,21 +1,49 @@
 import sqlite3
 import os
 
+# Lokasi database dapat diganti lewat variabel lingkungan (mis. untuk pengujian);
+# folder arsip, cadangan dan impor ikut berada di folder yang sama
+DB_PATH = os.environ.get('MSTOCK_DB', os.path.join('data', 'stok.db'))
+LOKASI_UTAMA = 1
+
+
+def path_data(*bagian):
+    return os.path.join(os.path.dirname(DB_PATH) or '.', *bagian)
+
+
+def koneksi(timeout=5.0):
+    return sqlite3.connect(DB_PATH, timeout=timeout)
+
+
+def _kolom(c, tabel):
+    return [r[1] for r in c.execute(f"PRAGMA table_info({tabel})")]
+
+
 def init_db():
     # Pastikan folder data ada
-    if not os.path.exists("data"):
-        os.makedirs("data")
+    os.makedirs(path_data(), exist_ok=True)
     
     # Koneksi database
-    conn = sqlite3.connect('data/stok.db')
+    conn = koneksi()
     c = conn.cursor()
     
+    # Halaman kosong bekas pengarsipan dapat dikembalikan tanpa VACUUM penuh;
+    # hanya berlaku untuk database baru (database lama diubah oleh arsipkan)
+    c.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
     # Tabel Produk
     c.execute('''CREATE TABLE IF NOT EXISTS produk (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     nama TEXT NOT NULL,
                     stok INTEGER NOT NULL,
                     satuan TEXT NOT NULL)''')
+
+    # Tabel Lokasi (toko/gudang)
+    c.execute('''CREATE TABLE IF NOT EXISTS lokasi (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nama TEXT NOT NULL UNIQUE)''')
+    c.execute("INSERT OR IGNORE INTO lokasi (id, nama) VALUES (?, 'Gudang Utama')",
+              (LOKASI_UTAMA,))
     
     # Tabel Transaksi Masuk
     c.execute('''CREATE TABLE IF NOT EXISTS transaksi_masuk (
@@ -23,7 +51,9 @@ def init_db():
                     produk_id INTEGER,
                     jumlah INTEGER NOT NULL,
                     tanggal TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY(produk_id) REFERENCES produk(id))''')
+                    lokasi_id INTEGER NOT NULL DEFAULT 1,
+                    FOREIGN KEY(produk_id) REFERENCES produk(id),
+                    FOREIGN KEY(lokasi_id) REFERENCES lokasi(id))''')
     
     # Tabel Transaksi Keluar
     c.execute('''CREATE TABLE IF NOT EXISTS transaksi_keluar (
@@ -31,7 +61,181 @@ def init_db():
                     produk_id INTEGER,
                     jumlah INTEGER NOT NULL,
                     tanggal TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY(produk_id) REFERENCES produk(id))''')
+                    lokasi_id INTEGER NOT NULL DEFAULT 1,
+                    FOREIGN KEY(produk_id) REFERENCES produk(id),
+                    FOREIGN KEY(lokasi_id) REFERENCES lokasi(id))''')
     
+    # Migrasi: transaksi lama tercatat di lokasi utama
+    for tabel in ('transaksi_masuk', 'transaksi_keluar'):
+        if 'lokasi_id' not in _kolom(c, tabel):
+            c.execute(f"ALTER TABLE {tabel} ADD COLUMN lokasi_id INTEGER NOT NULL "
+                      f"DEFAULT {LOKASI_UTAMA}")
+
+    # Saldo stok per lokasi (produk.stok tetap menyimpan total semua lokasi)
+    c.execute('''CREATE TABLE IF NOT EXISTS stok_lokasi (
+                    produk_id INTEGER NOT NULL,
+                    lokasi_id INTEGER NOT NULL,
+                    stok INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (produk_id, lokasi_id),
+                    FOREIGN KEY(produk_id) REFERENCES produk(id),
+                    FOREIGN KEY(lokasi_id) REFERENCES lokasi(id)) WITHOUT ROWID''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_stok_lokasi_lokasi
+                    ON stok_lokasi(lokasi_id, produk_id)''')
+    # Migrasi: produk tanpa saldo lokasi mendapat saldo di lokasi utama
+    c.execute('''INSERT INTO stok_lokasi (produk_id, lokasi_id, stok)
+                    SELECT id, ?, stok FROM produk p
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM stok_lokasi sl WHERE sl.produk_id = p.id)''',
+              (LOKASI_UTAMA,))
+
+    # Batch/lot per produk dan lokasi; sisa > 0 berarti lot masih terbuka.
+    # Jumlah sisa lot terbuka selalu sama dengan stok_lokasi.stok.
+    # masuk_id tanpa FOREIGN KEY: transaksi masuk asalnya bisa sudah pindah
+    # ke arsip tahunan (telusuri lewat arsip.cari)
+    ddl_lot = '''CREATE TABLE IF NOT EXISTS {} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    produk_id INTEGER NOT NULL,
+                    lokasi_id INTEGER NOT NULL,
+                    kode TEXT,
+                    kedaluwarsa DATE,
+                    tanggal TIMESTAMP,
+                    jumlah INTEGER NOT NULL,
+                    sisa INTEGER NOT NULL,
+                    masuk_id INTEGER,
+                    asal_lot_id INTEGER,
+                    FOREIGN KEY(produk_id) REFERENCES produk(id),
+                    FOREIGN KEY(lokasi_id) REFERENCES lokasi(id),
+                    FOREIGN KEY(asal_lot_id) REFERENCES lot(id))'''
+    if any(fk[2] == 'transaksi_masuk' for fk in c.execute("PRAGMA foreign_key_list(lot)")):
+        # Bangun ulang tanpa merename lot, agar rujukan alokasi_lot tetap ke lot
+        c.execute(ddl_lot.format('lot_baru'))
+        c.execute("INSERT INTO lot_baru SELECT * FROM lot")
+        c.execute("DROP TABLE lot")
+        c.execute("ALTER TABLE lot_baru RENAME TO lot")
+    c.execute(ddl_lot.format('lot'))
+    # Urutan alokasi FEFO lalu FIFO (lot tanpa kedaluwarsa paling akhir);
+    # lot habis keluar dari indeks sehingga pencarian lot berikutnya O(log n)
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_lot_terbuka
+                    ON lot(produk_id, lokasi_id, COALESCE(kedaluwarsa, '9999-12-31'), tanggal, id)
+                    WHERE sisa > 0''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_lot_kedaluwarsa
+                    ON lot(kedaluwarsa) WHERE sisa > 0 AND kedaluwarsa IS NOT NULL''')
+    # Migrasi: saldo lokasi tanpa lot menjadi satu lot saldo awal
+    c.execute('''INSERT INTO lot (produk_id, lokasi_id, kode, jumlah, sisa)
+                    SELECT produk_id, lokasi_id, 'SALDO-AWAL', stok, stok FROM stok_lokasi sl
+                    WHERE stok > 0 AND NOT EXISTS (
+                        SELECT 1 FROM lot WHERE lot.produk_id = sl.produk_id
+                                          AND lot.lokasi_id = sl.lokasi_id)''')
+
+    # Alokasi lot untuk setiap transaksi keluar
+    c.execute('''CREATE TABLE IF NOT EXISTS alokasi_lot (
+                    keluar_id INTEGER NOT NULL,
+                    lot_id INTEGER NOT NULL,
+                    jumlah INTEGER NOT NULL,
+                    PRIMARY KEY (keluar_id, lot_id),
+                    FOREIGN KEY(keluar_id) REFERENCES transaksi_keluar(id),
+                    FOREIGN KEY(lot_id) REFERENCES lot(id)) WITHOUT ROWID''')
+
+    # Tabel Transfer Antar Lokasi
+    c.execute('''CREATE TABLE IF NOT EXISTS transfer_stok (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    produk_id INTEGER NOT NULL,
+                    dari_lokasi_id INTEGER NOT NULL,
+                    ke_lokasi_id INTEGER NOT NULL,
+                    jumlah INTEGER NOT NULL,
+                    tanggal TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY(produk_id) REFERENCES produk(id),
+                    FOREIGN KEY(dari_lokasi_id) REFERENCES lokasi(id),
+                    FOREIGN KEY(ke_lokasi_id) REFERENCES lokasi(id))''')
+
+    # Tabel Tugas Latar Belakang
+    c.execute('''CREATE TABLE IF NOT EXISTS tugas (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    jenis TEXT NOT NULL,
+                    kunci TEXT NOT NULL,
+                    params TEXT,
+                    status TEXT NOT NULL DEFAULT 'antri',
+                    progres REAL NOT NULL DEFAULT 0,
+                    pesan TEXT,
+                    hasil TEXT,
+                    dibuat TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    dimulai TIMESTAMP,
+                    selesai TIMESTAMP)''')
+    # Hanya satu tugas aktif per kunci (deduplikasi)
+    c.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_tugas_aktif
+                    ON tugas(kunci) WHERE status IN ('antri', 'berjalan')''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_tugas_kunci ON tugas(kunci, id)''')
+
+    # Penanda impor CSV per berkas: baris yang sudah di-commit, agar impor
+    # yang gagal dapat dilanjutkan dan berkas yang sama tidak diimpor dua kali
+    c.execute('''CREATE TABLE IF NOT EXISTS impor_berkas (
+                    jenis TEXT NOT NULL,
+                    sidik TEXT NOT NULL,
+                    baris INTEGER NOT NULL DEFAULT 0,
+                    berhasil INTEGER NOT NULL DEFAULT 0,
+                    dilewati INTEGER NOT NULL DEFAULT 0,
+                    selesai TIMESTAMP,
+                    PRIMARY KEY (jenis, sidik))''')
+
+    # Tabel Rekap Bulanan (per produk dan lokasi)
+    rekap_lama = _kolom(c, 'rekap_bulanan')
+    if rekap_lama and 'lokasi_id' not in rekap_lama:
+        c.execute("ALTER TABLE rekap_bulanan RENAME TO rekap_bulanan_lama")
+    c.execute('''CREATE TABLE IF NOT EXISTS rekap_bulanan (
+                    produk_id INTEGER NOT NULL,
+                    lokasi_id INTEGER NOT NULL DEFAULT 1,
+                    bulan TEXT NOT NULL,
+                    masuk INTEGER NOT NULL DEFAULT 0,
+                    keluar INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (produk_id, lokasi_id, bulan),
+                    FOREIGN KEY(produk_id) REFERENCES produk(id),
+                    FOREIGN KEY(lokasi_id) REFERENCES lokasi(id))''')
+    if rekap_lama and 'lokasi_id' not in rekap_lama:
+        c.execute('''INSERT INTO rekap_bulanan (produk_id, lokasi_id, bulan, masuk, keluar)
+                        SELECT produk_id, ?, bulan, masuk, keluar FROM rekap_bulanan_lama''',
+                  (LOKASI_UTAMA,))
+        c.execute("DROP TABLE rekap_bulanan_lama")
+
+    # Indeks tanggal untuk filter periode dan pengarsipan
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_transaksi_masuk_tanggal
+                    ON transaksi_masuk(tanggal)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_transaksi_masuk_produk_tanggal
+                    ON transaksi_masuk(produk_id, tanggal)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_transaksi_keluar_tanggal
+                    ON transaksi_keluar(tanggal)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_transaksi_keluar_produk_tanggal
+                    ON transaksi_keluar(produk_id, tanggal)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_transaksi_masuk_lokasi_tanggal
+                    ON transaksi_masuk(lokasi_id, tanggal)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_transaksi_keluar_lokasi_tanggal
+                    ON transaksi_keluar(lokasi_id, tanggal)''')
+
+    # Log perubahan (audit dan change data capture), hanya boleh ditambah.
+    # AUTOINCREMENT menjamin seq naik terus dan tidak pernah dipakai ulang
+    c.execute('''CREATE TABLE IF NOT EXISTS log_perubahan (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    waktu TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    pengguna TEXT,
+                    tabel TEXT NOT NULL,
+                    operasi TEXT NOT NULL,
+                    entitas_id INTEGER,
+                    data TEXT)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_log_perubahan_tabel
+                    ON log_perubahan(tabel, seq)''')
+    for operasi in ('UPDATE', 'DELETE'):
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS log_perubahan_tolak_{operasi.lower()}
+                        BEFORE {operasi} ON log_perubahan
+                        BEGIN SELECT RAISE(ABORT, 'log_perubahan hanya dapat ditambah'); END''')
+
+    # Tabel Arsip (satu file database per tahun)
+    c.execute('''CREATE TABLE IF NOT EXISTS arsip (
+                    tahun INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    batas TEXT NOT NULL,
+                    diperbarui TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
     conn.commit()
+
+    # WAL agar pembacaan halaman tidak terblokir oleh tugas latar belakang
+    c.execute("PRAGMA journal_mode=WAL").fetchone()
     conn.close()
\ No newline at end of file
@@ -0,0 +1,230 @@
+import math
+
+import numpy as np
+import streamlit as st
+import plotly.graph_objects as go
+
+# Koefisien MacKinnon (1994, 2010) untuk regresi dengan konstanta, N = 1
+# (sama dengan yang dipakai statsmodels.tsa.adfvalues)
+TAU_MAX_C = 2.74
+TAU_MIN_C = -18.83
+TAU_STAR_C = -1.61
+TAU_C_SMALLP = (2.1659, 1.4412, 0.038269)
+TAU_C_LARGEP = (1.7339, 0.93202, -0.12745, -0.010368)
+TAU_C_2010 = {
+    "1%": (-3.43035, -6.5393, -16.786, -79.433),
+    "5%": (-2.86154, -2.8903, -4.234, -40.040),
+    "10%": (-2.56677, -1.5384, -2.809, 0),
+}
+
+MAX_LAGS = 20
+Z_95 = 1.959963984540054  # norm.ppf(0.975)
+
+
+def versi_data(conn, produk_id, lokasi_id=None):
+    # Penanda versi data transaksi keluar sebuah produk, dipakai sebagai kunci cache
+    query = ("SELECT COUNT(*), COALESCE(MAX(id), 0), COALESCE(SUM(jumlah), 0) "
+             "FROM transaksi_keluar WHERE produk_id = ?")
+    params = (produk_id,)
+    if lokasi_id is not None:
+        query += " AND lokasi_id = ?"
+        params += (lokasi_id,)
+    return tuple(conn.execute(query, params).fetchone())
+
+
+def _ols(y, X):
+    beta = np.linalg.pinv(X) @ y
+    resid = y - X @ beta
+    ssr = float(resid @ resid)
+    return beta, ssr
+
+
+def _aic(ssr, nobs, k):
+    llf = -nobs / 2 * (math.log(2 * math.pi) + math.log(ssr / nobs) + 1)
+    return -2 * llf + 2 * k
+
+
+def _lagmat(xdiff, lag):
+    # Kolom: [x_t, x_{t-1}, ..., x_{t-lag}] (trim kedua sisi)
+    n = len(xdiff)
+    return np.column_stack([xdiff[lag - j:n - j] for j in range(lag + 1)])
+
+
+def _norm_cdf(z):
+    return 0.5 * (1 + math.erf(z / math.sqrt(2)))
+
+
+def _mackinnon_p(stat):
+    if stat > TAU_MAX_C:
+        return 1.0
+    if stat < TAU_MIN_C:
+        return 0.0
+    coef = TAU_C_SMALLP if stat <= TAU_STAR_C else TAU_C_LARGEP
+    return _norm_cdf(sum(c * stat ** i for i, c in enumerate(coef)))
+
+
+def _mackinnon_crit(nobs):
+    return {
+        k: b[0] + b[1] / nobs + b[2] / nobs ** 2 + b[3] / nobs ** 3
+        for k, b in TAU_C_2010.items()
+    }
+
+
+def adf_test(x):
+    # Augmented Dickey-Fuller dengan konstanta, lag dipilih via AIC
+    # (setara adfuller(x, regression='c', autolag='AIC'))
+    x = np.asarray(x, dtype=float)
+    if len(x) == 0 or np.ptp(x) == 0:
+        return None
+    maxlag = int(math.ceil(12 * (len(x) / 100) ** 0.25))
+    maxlag = min(len(x) // 2 - 2, maxlag)
+    if maxlag < 0:
+        return None
+
+    xdiff = np.diff(x)
+
+    def _regresi(lag):
+        xdall = _lagmat(xdiff, lag)
+        nobs = xdall.shape[0]
+        xdall[:, 0] = x[-nobs - 1:-1]
+        return xdall, xdiff[-nobs:]
+
+    # Pilih lag terbaik pada sampel yang sama (panjang maxlag)
+    xdall, y = _regresi(maxlag)
+    full = np.column_stack([np.ones(len(y)), xdall])
+    best_aic, best_lag = np.inf, 0
+    for lag in range(maxlag + 1):
+        _, ssr = _ols(y, full[:, :lag + 2])
+        aic = _aic(ssr, len(y), lag + 2)
+        if aic < best_aic:
+            best_aic, best_lag = aic, lag
+
+    xdall, y = _regresi(best_lag)
+    X = np.column_stack([xdall, np.ones(len(y))])
+    nobs, k = X.shape
+    if nobs <= k:
+        return None
+    beta, ssr = _ols(y, X)
+    sigma2 = ssr / (nobs - k)
+    se = math.sqrt(sigma2 * np.linalg.pinv(X.T @ X)[0, 0])
+    if se == 0:
+        return None
+    stat = float(beta[0] / se)
+    return {
+        "statistik": stat,
+        "p_value": _mackinnon_p(stat),
+        "lag": best_lag,
+        "nobs": nobs,
+        "nilai_kritis": _mackinnon_crit(nobs),
+    }
+
+
+def acf_fft(x, nlags):
+    # Autokorelasi via FFT (bias, seperti statsmodels acf(fft=True))
+    x = np.asarray(x, dtype=float)
+    n = len(x)
+    xo = x - x.mean()
+    n_fft = 1 << (2 * n - 1).bit_length()
+    f = np.fft.rfft(xo, n=n_fft)
+    acov = np.fft.irfft(f * np.conjugate(f), n=n_fft)[:nlags + 1] / n
+    acf = acov / acov[0]
+
+    # Interval kepercayaan 95% (rumus Bartlett)
+    varacf = np.ones(nlags + 1) / n
+    varacf[0] = 0
+    varacf[2:] *= 1 + 2 * np.cumsum(acf[1:-1] ** 2)
+    return acf, Z_95 * np.sqrt(varacf)
+
+
+def pacf_yw(acf, n):
+    # Autokorelasi parsial via rekursi Levinson-Durbin atas ACF
+    nlags = len(acf) - 1
+    pacf = np.zeros(nlags + 1)
+    pacf[0] = 1
+    if nlags == 0:
+        return pacf, np.zeros(1)
+    phi = np.zeros(nlags + 1)
+    phi[1] = pacf[1] = acf[1]
+    sig = 1 - acf[1] ** 2
+    for k in range(2, nlags + 1):
+        pk = (acf[k] - phi[1:k] @ acf[1:k][::-1]) / sig
+        phi[1:k] = phi[1:k] - pk * phi[1:k][::-1]
+        phi[k] = pacf[k] = pk
+        sig *= 1 - pk ** 2
+    band = np.full(nlags + 1, Z_95 / math.sqrt(n))
+    band[0] = 0
+    return pacf, band
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def hitung_diagnostik(produk_id, lokasi_id, versi, _seri):
+    # Hasil di-cache per produk, lokasi dan versi data; _seri tidak ikut di-hash
+    seri = np.asarray(_seri, dtype=float)
+    hasil = {"adf": adf_test(seri), "differensiasi": False, "seri": seri}
+    if hasil["adf"] is not None and hasil["adf"]["p_value"] > 0.05:
+        hasil["differensiasi"] = True
+        seri = np.diff(seri)
+        hasil["seri"] = seri
+
+    nlags = min(MAX_LAGS, len(seri) // 2 - 1)
+    if nlags < 1 or np.ptp(seri) == 0:
+        hasil["acf"] = hasil["pacf"] = None
+        return hasil
+    acf, band_acf = acf_fft(seri, nlags)
+    pacf, band_pacf = pacf_yw(acf, len(seri))
+    hasil["acf"] = (acf, band_acf)
+    hasil["pacf"] = (pacf, band_pacf)
+    return hasil
+
+
+def _grafik_korelasi(nilai, band, judul):
+    lags = np.arange(len(nilai))
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=np.concatenate([lags, lags[::-1]]),
+        y=np.concatenate([band, -band[::-1]]),
+        fill='toself', fillcolor='rgba(46, 204, 113, 0.2)',
+        line=dict(width=0), hoverinfo='skip', name='95% CI'
+    ))
+    fig.add_trace(go.Bar(x=lags, y=nilai, width=0.2,
+                  marker_color='#2ECC71', name=judul))
+    fig.update_layout(
+        title=judul,
+        template='plotly_white',
+        showlegend=False,
+        margin=dict(l=20, r=20, t=40, b=20),
+        xaxis_title='Lag',
+        yaxis=dict(range=[-1.05, 1.05])
+    )
+    return fig
+
+
+def tampilkan_diagnostik(hasil):
+    st.subheader("Uji Stasioneritas (ADF Test)")
+    adf = hasil["adf"]
+    if adf is None:
+        st.info("Data terlalu sedikit atau konstan untuk uji ADF.", icon="ℹ️")
+    else:
+        col1, col2, col3 = st.columns(3)
+        col1.metric("ADF Statistic", f"{adf['statistik']:.4f}")
+        col2.metric("p-value", f"{adf['p_value']:.4f}")
+        col3.metric("Lag", adf["lag"])
+        st.caption("Nilai kritis: " + ", ".join(
+            f"{k}: {v:.3f}" for k, v in adf["nilai_kritis"].items()))
+        if hasil["differensiasi"]:
+            st.write("Data tidak stasioner, dilakukan differensiasi.")
+            st.line_chart(hasil["seri"], height=200)
+        else:
+            st.write("Data sudah stasioner, asumsi metode ARIMA terpenuhi.")
+
+    st.subheader("Plot Autokorelasi (ACF) dan Autokorelasi Parsial (PACF)")
+    if hasil["acf"] is None:
+        st.info("Data belum cukup untuk menghitung ACF/PACF.", icon="ℹ️")
+        return
+    col_acf, col_pacf = st.columns(2)
+    with col_acf:
+        st.plotly_chart(_grafik_korelasi(*hasil["acf"], "ACF"),
+                        use_container_width=True)
+    with col_pacf:
+        st.plotly_chart(_grafik_korelasi(*hasil["pacf"], "PACF"),
+                        use_container_width=True)
@@ -0,0 +1,115 @@
+import streamlit as st
+import sqlite3
+from datetime import datetime
+import pandas as pd
+from stok import daftar_lokasi, pilih_lokasi, stok_di, tambah_lokasi, transfer
+from perubahan import pengguna
+from database import koneksi
+
+
+def main():
+    st.header("📍 Lokasi & Transfer Stok", divider="green")
+    conn = koneksi()
+    c = conn.cursor()
+
+    # Ringkasan stok per lokasi
+    st.subheader("🏬 Stok per Lokasi")
+    df_lokasi = pd.read_sql_query('''
+        SELECT
+            l.nama AS Lokasi,
+            COUNT(CASE WHEN sl.stok > 0 THEN 1 END) AS Produk,
+            COALESCE(SUM(sl.stok), 0) AS Stok
+        FROM lokasi l
+        LEFT JOIN stok_lokasi sl ON sl.lokasi_id = l.id
+        GROUP BY l.id
+        ORDER BY l.id
+    ''', conn)
+    st.dataframe(
+        df_lokasi.style.format({'Produk': '{:,}', 'Stok': '{:,}'}),
+        use_container_width=True,
+        hide_index=True
+    )
+
+    col_tambah, col_transfer = st.columns(2)
+
+    # Form Tambah Lokasi
+    with col_tambah:
+        with st.form("tambah_lokasi_form", border=True):
+            st.write("➕ Tambah Lokasi")
+            nama = st.text_input(
+                "Nama Lokasi",
+                placeholder="Contoh: Toko Cabang 2",
+                help="Nama toko atau gudang"
+            )
+            if st.form_submit_button("Tambah Lokasi", type="primary"):
+                if not nama:
+                    st.error("Nama lokasi wajib diisi!", icon="❌")
+                else:
+                    try:
+                        with conn:
+                            tambah_lokasi(c, nama, pengguna())
+                        st.success('Lokasi berhasil ditambahkan!', icon="✅")
+                        st.rerun()
+                    except sqlite3.IntegrityError:
+                        st.error(f"Lokasi {nama} sudah ada!", icon="❌")
+
+    # Form Transfer Antar Lokasi
+    with col_transfer:
+        produk = c.execute("SELECT id, nama FROM produk").fetchall()
+        if len(daftar_lokasi(conn)) < 2 or not produk:
+            st.info("Transfer membutuhkan minimal dua lokasi dan satu produk.", icon="ℹ️")
+        else:
+            st.write("🔁 Transfer Stok")
+            nama_produk = dict(produk)
+            produk_id = st.selectbox(
+                "Produk",
+                list(nama_produk),
+                format_func=lambda x: f"📦 {nama_produk[x]}",
+                key="produk_transfer"
+            )
+            dari = pilih_lokasi(conn, "Dari Lokasi", key="dari_transfer", semua=False)
+            ke = pilih_lokasi(conn, "Ke Lokasi", key="ke_transfer", semua=False)
+            tersedia = stok_di(c, produk_id, dari)
+            with st.form("transfer_form", border=True):
+                jumlah = st.number_input(
+                    f"Jumlah (tersedia: {tersedia:,})",
+                    min_value=1,
+                    step=1,
+                    help="Jumlah barang yang dipindahkan"
+                )
+                tanggal = st.date_input("Tanggal Transfer", value=datetime.now())
+                if st.form_submit_button("Transfer", type="primary"):
+                    try:
+                        with conn:
+                            transfer(c, produk_id, dari, ke, jumlah, tanggal, pengguna())
+                        st.success('Transfer berhasil!', icon="✅")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Error: {str(e)}", icon="❌")
+
+    # Riwayat Transfer
+    st.subheader("📚 Transfer Terakhir")
+    df_transfer = pd.read_sql_query('''
+        SELECT
+            p.nama AS Produk,
+            ld.nama AS Dari,
+            lk.nama AS Ke,
+            t.jumlah AS Jumlah,
+            strftime('%d-%m-%Y', t.tanggal) AS Tanggal
+        FROM transfer_stok t
+        JOIN produk p ON t.produk_id = p.id
+        JOIN lokasi ld ON t.dari_lokasi_id = ld.id
+        JOIN lokasi lk ON t.ke_lokasi_id = lk.id
+        ORDER BY t.id DESC
+        LIMIT 10
+    ''', conn)
+    if df_transfer.empty:
+        st.info("Belum ada transfer stok.", icon="📭")
+    else:
+        st.dataframe(
+            df_transfer.style.format({'Jumlah': '{:,}'}),
+            use_container_width=True,
+            hide_index=True
+        )
+
+    conn.close()
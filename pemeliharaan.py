@@ -0,0 +1,131 @@
+import json
+import streamlit as st
+import pandas as pd
+import arsip
+import cadangan
+import tugas
+import perubahan
+from database import koneksi
+
+
+def main():
+    st.header("🛠️ Pemeliharaan Data", divider="green")
+    conn = koneksi()
+
+    # Arsip Transaksi
+    st.subheader("🗄️ Arsip Transaksi")
+    st.caption(
+        "Transaksi lama dipindahkan ke file arsip per tahun. Rekap bulanan tetap "
+        "disimpan di database utama dan riwayat tetap dapat dibaca dari halaman transaksi."
+    )
+    with st.form("arsip_form", border=True):
+        bulan = st.number_input(
+            "Arsipkan transaksi yang lebih lama dari (bulan)",
+            min_value=1,
+            value=12,
+            step=1,
+            help="Periode ditutup per awal bulan"
+        )
+        batas = arsip.batas_bulan(int(bulan))
+        st.write(f"Transaksi sebelum **{batas.strftime('%d-%m-%Y')}** akan diarsipkan.")
+        if st.form_submit_button("Arsipkan", type="primary"):
+            st.session_state.tugas_arsip = tugas.kirim(
+                'arsip', {'bulan': int(bulan)}, kunci='arsip')
+
+    tugas_arsip = st.session_state.get('tugas_arsip')
+    info = tugas.status(tugas_arsip) if tugas_arsip else None
+    if info and info['status'] in tugas.STATUS_AKTIF:
+        tugas.pantau(tugas_arsip)
+    elif info and info['status'] == 'selesai':
+        st.success(
+            f"{info['hasil']['dipindah']:,} transaksi diarsipkan.", icon="✅")
+    elif info:
+        st.error(f"Pengarsipan gagal: {info['pesan']}", icon="❌")
+
+    df_arsip = pd.DataFrame(arsip.ringkasan(conn))
+    if df_arsip.empty:
+        st.info("Belum ada arsip.", icon="📭")
+    else:
+        st.dataframe(
+            df_arsip.style.format({'Masuk': '{:,}', 'Keluar': '{:,}'}),
+            use_container_width=True,
+            hide_index=True
+        )
+
+    # Log Perubahan
+    st.subheader("📜 Log Perubahan")
+    st.caption("Catatan setiap perubahan produk, lokasi, transaksi dan transfer (hanya dapat ditambah). "
+               "Kolom Pengguna hanya terisi bila aplikasi memakai login Streamlit; "
+               "'-' berarti perubahan dibuat tanpa pengguna yang terautentikasi.")
+    log = perubahan.terbaru(conn)
+    if not log:
+        st.info("Belum ada perubahan tercatat.", icon="📭")
+    else:
+        df_log = pd.DataFrame([
+            {'Seq': p['seq'], 'Waktu': p['waktu'], 'Pengguna': p['pengguna'] or '-',
+             'Tabel': p['tabel'], 'Operasi': p['operasi'], 'ID': p['entitas_id'],
+             'Data': json.dumps(p['data'], ensure_ascii=False) if p['data'] else ''}
+            for p in log
+        ])
+        st.dataframe(df_log, use_container_width=True, hide_index=True)
+
+    conn.close()
+
+    # Cadangan Database
+    st.subheader("💾 Cadangan Database")
+    st.caption(
+        f"Snapshot otomatis setiap {cadangan.INTERVAL_JAM} jam, "
+        f"{cadangan.RETENSI} cadangan terbaru disimpan (terkompresi). "
+        "File arsip tahunan ikut dicadangkan setiap kali berubah."
+    )
+    penjadwal = cadangan.status_penjadwal()
+    if penjadwal and penjadwal.get('gagal', '') > penjadwal.get('berhasil', ''):
+        st.error(f"Cadangan terjadwal terakhir gagal ({penjadwal['gagal']}): "
+                 f"{penjadwal['pesan']}", icon="⚠️")
+    if st.button("Buat Cadangan Sekarang", key="buat_cadangan"):
+        st.session_state.tugas_cadangan = tugas.kirim('cadangan', kunci='cadangan')
+
+    tugas_cadangan = st.session_state.get('tugas_cadangan')
+    info = tugas.status(tugas_cadangan) if tugas_cadangan else None
+    if info and info['status'] in tugas.STATUS_AKTIF:
+        tugas.pantau(tugas_cadangan)
+    elif info and info['status'] == 'selesai':
+        st.success(f"Cadangan {info['hasil']['nama']} berhasil dibuat.", icon="✅")
+    elif info:
+        st.error(f"Pencadangan gagal: {info['pesan']}", icon="❌")
+
+    daftar = cadangan.daftar_cadangan()
+    if not daftar:
+        st.info("Belum ada cadangan.", icon="📭")
+        return
+
+    df_cadangan = pd.DataFrame([
+        {'Berkas': c['nama'],
+         'Ukuran (KB)': c['ukuran'] / 1024,
+         'Waktu': c['waktu'].strftime('%d-%m-%Y %H:%M:%S')}
+        for c in daftar
+    ])
+    st.dataframe(
+        df_cadangan.style.format({'Ukuran (KB)': '{:,.1f}'}),
+        use_container_width=True,
+        hide_index=True
+    )
+
+    # Pemulihan
+    with st.form("pulihkan_form", border=True):
+        st.write("♻️ Pulihkan dari Cadangan")
+        pilihan = st.selectbox("Pilih Cadangan", [c['nama'] for c in daftar])
+        yakin = st.checkbox(
+            "Saya mengerti data saat ini akan diganti (kondisi sekarang dicadangkan terlebih dahulu)")
+        if st.form_submit_button("Pulihkan", type="primary"):
+            if not yakin:
+                st.error("Centang konfirmasi terlebih dahulu!", icon="❌")
+            else:
+                try:
+                    with st.spinner("Memulihkan database..."):
+                        hasil = cadangan.pulihkan(pilihan, perubahan.pengguna())
+                    st.success(
+                        f"Database dipulihkan dari {hasil['dipulihkan']}. "
+                        f"Kondisi sebelumnya disimpan sebagai {hasil['pengaman']}.", icon="✅")
+                except Exception as e:
+                    st.error(f"Error: {str(e)}", icon="❌")
@@ -0,0 +1,92 @@
+import json
+import time
+
+import streamlit as st
+
+from database import koneksi
+
+# Log perubahan stok (audit + change data capture). catat() dipanggil di dalam
+# transaksi mutasi, sehingga baris log ikut commit atau rollback bersamanya.
+# SQLite hanya mengizinkan satu penulis, jadi urutan seq sama dengan urutan
+# commit: konsumen yang membaca "seq > terakhir" tidak akan melewatkan perubahan.
+
+UKURAN_HALAMAN = 500
+
+
+def pengguna():
+    # Email pengguna bila aplikasi memakai login Streamlit. Tanpa login tidak
+    # ada pengguna yang terautentikasi, jadi dicatat None (bukan akun OS server
+    # yang sama untuk semua orang)
+    user = getattr(st, 'user', None)
+    if user is not None and user.get('is_logged_in'):
+        return user.get('email') or user.get('name')
+    return None
+
+
+def catat(c, tabel, operasi, entitas_id, data=None, pengguna=None):
+    cur = c.execute(
+        '''INSERT INTO log_perubahan (pengguna, tabel, operasi, entitas_id, data)
+           VALUES (?, ?, ?, ?, ?)''',
+        (pengguna, tabel, operasi, entitas_id,
+         json.dumps(data, default=str) if data is not None else None))
+    return cur.lastrowid
+
+
+def lanjutkan_seq(c, seq):
+    # Pastikan seq berikutnya lebih besar dari seq yang pernah dibagikan
+    # (mis. setelah database dipulihkan dari cadangan yang lebih lama)
+    if not c.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'log_perubahan'",
+                     (seq,)).rowcount:
+        c.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('log_perubahan', ?)", (seq,))
+
+
+def seq_terakhir(conn):
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM log_perubahan").fetchone()[0]
+
+
+def _ke_dict(rows):
+    return [
+        {'seq': r[0], 'waktu': r[1], 'pengguna': r[2], 'tabel': r[3], 'operasi': r[4],
+         'entitas_id': r[5], 'data': json.loads(r[6]) if r[6] else None}
+        for r in rows
+    ]
+
+
+def terbaru(conn, batas=20):
+    # Perubahan terbaru lebih dulu
+    return _ke_dict(conn.execute(
+        "SELECT seq, waktu, pengguna, tabel, operasi, entitas_id, data FROM log_perubahan "
+        "ORDER BY seq DESC LIMIT ?", (batas,)))
+
+
+def sejak(conn, seq=0, batas=UKURAN_HALAMAN, tabel=None):
+    # Perubahan dengan seq > seq, terurut naik (pencarian rentang pada rowid)
+    query = "SELECT seq, waktu, pengguna, tabel, operasi, entitas_id, data FROM log_perubahan WHERE seq > ?"
+    params = (seq,)
+    if tabel:
+        # Penanda pemulihan database selalu ikut terkirim
+        query += " AND (tabel = ? OR tabel = 'database')"
+        params += (tabel,)
+    return _ke_dict(conn.execute(query + " ORDER BY seq LIMIT ?", params + (batas,)))
+
+
+def alirkan(seq=0, tabel=None, interval=None, ukuran=UKURAN_HALAMAN):
+    # Generator perubahan sejak seq. Tanpa interval berhenti setelah perubahan
+    # terakhir; dengan interval (detik) terus menunggu perubahan baru.
+    # Konsumen menyimpan seq perubahan terakhir yang diproses untuk melanjutkan;
+    # perubahan tabel 'database' operasi 'pulihkan' berarti data turunan harus
+    # dibangun ulang dari awal.
+    conn = koneksi(timeout=30)
+    try:
+        while True:
+            halaman = sejak(conn, seq, ukuran, tabel)
+            for perubahan in halaman:
+                yield perubahan
+            if halaman:
+                seq = halaman[-1]['seq']
+            if len(halaman) < ukuran:
+                if interval is None:
+                    return
+                time.sleep(interval)
+    finally:
+        conn.close()
@@ -1,19 +1,95 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
 import plotly.express as px
 from statsmodels.tsa.arima.model import ARIMA
-from statsmodels.tsa.stattools import adfuller
-from statsmodels.graphics.tsaplots import plot_acf, plot_pacf
 import numpy as np
-import matplotlib.pyplot as plt
+from diagnostik import versi_data, hitung_diagnostik, tampilkan_diagnostik
+import tugas
+import arsip
+from stok import pilih_lokasi
+from database import koneksi
+
+
+def data_bulanan(conn, produk_id, lokasi_id=None):
+    # Riwayat lengkap: bulan yang sudah diarsipkan dari rekap_bulanan,
+    # sisanya dari tabel utama (tanpa ATTACH seluruh arsip tahunan)
+    filter_lokasi = ""
+    params = (produk_id,)
+    if lokasi_id is not None:
+        filter_lokasi = " AND lokasi_id = ?"
+        params += (lokasi_id,)
+    query = "SELECT tanggal, jumlah FROM transaksi_keluar WHERE produk_id = ?" + filter_lokasi
+    batas = arsip.batas_arsip(conn)
+    if batas:
+        query = ("SELECT bulan || '-01' AS tanggal, keluar AS jumlah FROM rekap_bulanan "
+                 "WHERE produk_id = ?" + filter_lokasi + " AND bulan < ? "
+                 "UNION ALL " + query + " AND tanggal >= ?")
+        params = params + (batas[:7],) + params + (batas,)
+    df_transaksi = pd.read_sql_query(
+        query + " ORDER BY tanggal",
+        conn,
+        params=params,
+        parse_dates=['tanggal']
+    )
+    if df_transaksi.empty:
+        return df_transaksi
+
+    # Agregasi data per bulan (3 tahun terakhir)
+    df_transaksi.set_index('tanggal', inplace=True)
+    return df_transaksi.resample('ME').sum().reset_index()
+
+
+def hitung_prediksi(df_monthly, progres=None):
+    # Estimasi beberapa model ARIMA dan ramalkan 12 bulan ke depan
+    models = [(1,1,1), (0,1,1), (1,1,2)]  # Contoh kombinasi model
+    hasil = {'model': [], 'terbaik': None, 'mse': None, 'prediksi': []}
+    model_results = {}
+    for i, order in enumerate(models):
+        if progres:
+            progres(i / (len(models) + 1), f"Mengestimasi model {order}...")
+        try:
+            model = ARIMA(df_monthly['jumlah'], order=order)
+            model_results[order] = model.fit()
+        except Exception as e:
+            hasil['model'].append({'order': order, 'error': str(e)})
+
+    best_model = None
+    best_mse = np.inf
+    for order, results in model_results.items():
+        forecast = results.forecast(steps=12)
+        # Gunakan data terakhir untuk evaluasi sederhana (pseudo-MSE)
+        if len(df_monthly) >= 12:
+            actual = df_monthly['jumlah'][-12:]
+            mse = float(np.mean((forecast.to_numpy() - actual.to_numpy()) ** 2))
+        else:
+            mse = float(results.mse)  # Gunakan MSE dari model jika data kurang
+        hasil['model'].append({'order': order, 'mse': mse})
+        if mse < best_mse:
+            best_mse = mse
+            best_model = results
+
+    if best_model is None:
+        return hasil
+
+    if progres:
+        progres(len(models) / (len(models) + 1), "Menyusun peramalan...")
+    forecast = best_model.forecast(steps=12)
+    forecast_dates = pd.date_range(start=df_monthly['tanggal'].iloc[-1], periods=13, freq='ME')[1:]
+    hasil['terbaik'] = best_model.model.order
+    hasil['mse'] = best_mse
+    hasil['prediksi'] = [
+        {'tanggal': d.strftime('%Y-%m-%d'), 'prediksi': float(v)}
+        for d, v in zip(forecast_dates, forecast)
+    ]
+    return hasil
+
 
 def main():
     # Judul halaman
     st.header("📈 Prediksi Stok", divider="green")
 
     # Koneksi ke database
-    conn = sqlite3.connect('data/stok.db')
+    conn = koneksi()
     c = conn.cursor()
 
     # Pilih produk
@@ -23,25 +99,22 @@ def main():
         conn.close()
         return
     daftar_produk = [p[1] for p in produk]
-    produk_pilihan = st.selectbox("Pilih Produk untuk Prediksi", daftar_produk)
+    col_produk, col_lokasi = st.columns([3, 1])
+    with col_produk:
+        produk_pilihan = st.selectbox("Pilih Produk untuk Prediksi", daftar_produk)
+    with col_lokasi:
+        lokasi_id = pilih_lokasi(conn, key="lokasi_prediksi")
     produk_id = [p[0] for p in produk if p[1] == produk_pilihan][0]
 
     # 1. Data Transaksi Barang Terpilih
     st.subheader("Data Transaksi Keluar Barang Terpilih")
-    df_transaksi = pd.read_sql_query(
-        f"SELECT tanggal, jumlah FROM transaksi_keluar WHERE produk_id = {produk_id} ORDER BY tanggal",
-        conn,
-        parse_dates=['tanggal']
-    )
+    df_monthly = data_bulanan(conn, produk_id, lokasi_id)
+    versi = versi_data(conn, produk_id, lokasi_id)
     conn.close()
 
-    if df_transaksi.empty:
+    if df_monthly.empty:
         st.warning("Tidak ada data transaksi keluar untuk produk ini.", icon="⚠️")
         return
-
-    # Agregasi data per bulan (3 tahun terakhir)
-    df_transaksi.set_index('tanggal', inplace=True)
-    df_monthly = df_transaksi.resample('M').sum().reset_index()
     st.dataframe(df_monthly)
 
     # 2. Grafik Data Transaksi Barang Terpilih
@@ -49,73 +122,52 @@ def main():
     fig_transaksi = px.line(df_monthly, x='tanggal', y='jumlah', title='Transaksi Keluar Bulanan')
     st.plotly_chart(fig_transaksi, use_container_width=True)
 
-    # 3. Uji Stasioneritas dan Differensiasi
-    st.subheader("Uji Stasioneritas (ADF Test)")
-    result = adfuller(df_monthly['jumlah'])
-    st.write(f"ADF Statistic: {result[0]}")
-    st.write(f"p-value: {result[1]}")
-    if result[1] > 0.05:
-        st.write("Data tidak stasioner, dilakukan differensiasi.")
-        df_diff = df_monthly['jumlah'].diff().dropna()
-        # 4. Grafik Data Differensiasi
-        st.subheader("Grafik Data Setelah Differensiasi")
-        fig_diff = px.line(df_diff, title='Data Setelah Differensiasi')
-        st.plotly_chart(fig_diff, use_container_width=True)
-    else:
-        st.write("Data sudah stasioner, asumsi metode ARIMA terpenuhi.")
-        df_diff = df_monthly['jumlah']
-
-    # 5. Plot ACF dan PACF
-    st.subheader("Plot Autokorelasi (ACF) dan Autokorelasi Parsial (PACF)")
-    fig_acf, ax_acf = plt.subplots()
-    plot_acf(df_diff, lags=20, ax=ax_acf)
-    st.pyplot(fig_acf)
-
-    fig_pacf, ax_pacf = plt.subplots()
-    plot_pacf(df_diff, lags=20, ax=ax_pacf)
-    st.pyplot(fig_pacf)
+    # 3. Diagnostik (ADF, ACF, PACF) hanya dihitung saat diminta
+    if st.toggle("Tampilkan uji stasioneritas dan ACF/PACF", key="diagnostik_prediksi"):
+        hasil = hitung_diagnostik(produk_id, lokasi_id, versi, df_monthly['jumlah'].to_numpy())
+        tampilkan_diagnostik(hasil)
 
-    # 6. Estimasi Model ARIMA
+    # 4. Estimasi Model ARIMA (dijalankan sebagai tugas latar belakang)
     st.subheader("Estimasi Model ARIMA")
-    models = [(1,1,1), (0,1,1), (1,1,2)]  # Contoh kombinasi model
-    model_results = {}
-    for order in models:
-        try:
-            model = ARIMA(df_monthly['jumlah'], order=order)
-            results = model.fit()
-            model_results[order] = results
-            st.write(f"Model {order} berhasil diestimasi.")
-        except Exception as e:
-            st.write(f"Model {order} gagal: {str(e)}")
+    params_tugas = {'produk_id': produk_id, 'lokasi_id': lokasi_id}
+    kunci = f"prediksi:{produk_id}:{lokasi_id}:{':'.join(map(str, versi))}"
+    info = tugas.terakhir(kunci)
+    if info is None:
+        tugas_id = tugas.kirim('prediksi', params_tugas, kunci=kunci)
+        info = tugas.status(tugas_id)
+    if info['status'] in tugas.STATUS_AKTIF:
+        tugas.pantau(info['id'])
+        return
+    if info['status'] == 'gagal':
+        st.error(f"Prediksi gagal: {info['pesan']}", icon="❌")
+        if st.button("🔄 Ulangi Prediksi"):
+            tugas.kirim('prediksi', params_tugas, kunci=kunci)
+            st.rerun()
+        return
 
-    # 7. Pemilihan Model Terbaik
-    st.subheader("Pemilihan Model Terbaik")
-    best_model = None
-    best_mse = np.inf
-    for order, results in model_results.items():
-        forecast = results.forecast(steps=12)
-        # Gunakan data terakhir untuk evaluasi sederhana (pseudo-MSE)
-        if len(df_monthly) >= 12:
-            actual = df_monthly['jumlah'][-12:]
-            mse = np.mean((forecast - actual) ** 2)
+    hasil = info['hasil']
+    for m in hasil['model']:
+        if 'error' in m:
+            st.write(f"Model {tuple(m['order'])} gagal: {m['error']}")
         else:
-            mse = results.mse  # Gunakan MSE dari model jika data kurang
-        st.write(f"Model {order}: MSE = {mse}")
-        if mse < best_mse:
-            best_mse = mse
-            best_model = results
+            st.write(f"Model {tuple(m['order'])} berhasil diestimasi.")
 
-    if best_model:
-        st.write(f"Model Terbaik: Order {best_model.model.order}, MSE: {best_mse}")
+    # 5. Pemilihan Model Terbaik
+    st.subheader("Pemilihan Model Terbaik")
+    for m in hasil['model']:
+        if 'mse' in m:
+            st.write(f"Model {tuple(m['order'])}: MSE = {m['mse']}")
+
+    if hasil['terbaik']:
+        st.write(f"Model Terbaik: Order {tuple(hasil['terbaik'])}, MSE: {hasil['mse']}")
     else:
         st.error("Tidak ada model yang cocok ditemukan.", icon="❌")
         return
 
-    # 8. Peramalan
+    # 6. Peramalan
     st.subheader("Peramalan untuk 12 Bulan ke Depan")
-    forecast = best_model.forecast(steps=12)
-    forecast_dates = pd.date_range(start=df_monthly['tanggal'].iloc[-1], periods=13, freq='M')[1:]
-    df_forecast = pd.DataFrame({'tanggal': forecast_dates, 'prediksi': forecast})
+    df_forecast = pd.DataFrame(hasil['prediksi'])
+    df_forecast['tanggal'] = pd.to_datetime(df_forecast['tanggal'])
     st.dataframe(df_forecast)
 
     # Grafik Peramalan
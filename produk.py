@@ -1,16 +1,18 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
+from stok import pilih_lokasi, tambah_produk
+from perubahan import pengguna
+from database import koneksi
 
 
 def main():
     st.header("📦 Manajemen Produk", divider="green")
-    conn = sqlite3.connect('data/stok.db')
+    conn = koneksi()
     c = conn.cursor()
 
     # Pencarian dan Filter
     with st.expander("🔍 Filter & Pencarian", expanded=True):
-        col_search, col_filter = st.columns([3, 1])
+        col_search, col_filter, col_lokasi = st.columns([3, 1, 1])
         with col_search:
             search_query = st.text_input(
                 "Cari Produk",
@@ -28,15 +30,25 @@ def main():
                 placeholder="Pilih satuan",
                 help="Filter berdasarkan satuan produk"
             )
+        with col_lokasi:
+            lokasi_id = pilih_lokasi(
+                conn, key="lokasi_produk",
+                help="Tampilkan stok di lokasi tertentu")
 
     # Pagination
     items_per_page = 5
     page_number = st.session_state.get('page_produk', 1)
-    offset = (page_number - 1) * items_per_page
 
     # Query dengan pencarian dan filter
-    query = "SELECT * FROM produk WHERE 1=1"
-    params = []
+    if lokasi_id is None:
+        query = "SELECT id, nama, stok, satuan FROM produk WHERE 1=1"
+        params = []
+    else:
+        # Saldo per lokasi dibaca dari indeks (lokasi_id, produk_id)
+        query = """SELECT p.id, p.nama, sl.stok, p.satuan
+                   FROM stok_lokasi sl JOIN produk p ON p.id = sl.produk_id
+                   WHERE sl.lokasi_id = ?"""
+        params = [lokasi_id]
 
     if search_query:
         query += " AND nama LIKE ?"
@@ -49,6 +61,8 @@ def main():
         f"SELECT COUNT(*) FROM ({query})", params).fetchone()[0]
     total_pages = (total_produk // items_per_page) + \
         (1 if total_produk % items_per_page > 0 else 0)
+    page_number = min(page_number, max(total_pages, 1))
+    offset = (page_number - 1) * items_per_page
 
     # Pagination Controls
     with st.container():
@@ -60,14 +74,14 @@ def main():
         with col_info:
             st.write(f"Halaman {page_number} dari {total_pages}")
         with col_next:
-            if st.button("Selanjutnya ➡️", disabled=(page_number == total_pages)):
+            if st.button("Selanjutnya ➡️", disabled=(page_number >= total_pages)):
                 st.session_state.page_produk = page_number + 1
                 st.rerun()
         with col_jump:
             new_page = st.number_input(
                 "Lompat ke halaman",
                 min_value=1,
-                max_value=total_pages,
+                max_value=max(total_pages, 1),
                 value=page_number,
                 step=1
             )
@@ -95,13 +109,19 @@ def main():
             )
             if not satuan:
                 st.warning("Satuan wajib diisi!", icon="⚠️")
-        stok = st.number_input(
-            "Stok Awal",
-            min_value=0,
-            value=0,
-            step=1,
-            help="Masukkan jumlah stok awal"
-        )
+        col3, col4 = st.columns(2)
+        with col3:
+            stok = st.number_input(
+                "Stok Awal",
+                min_value=0,
+                value=0,
+                step=1,
+                help="Masukkan jumlah stok awal"
+            )
+        with col4:
+            lokasi_awal = pilih_lokasi(
+                conn, "Lokasi Stok Awal", key="lokasi_stok_awal", semua=False,
+                help="Lokasi penyimpanan stok awal")
 
         submitted = st.form_submit_button("Tambah Produk", type="primary")
 
@@ -111,8 +131,7 @@ def main():
             else:
                 try:
                     with conn:
-                        c.execute("INSERT INTO produk (nama, stok, satuan) VALUES (?, ?, ?)",
-                                  (nama, stok, satuan))
+                        tambah_produk(c, nama, satuan, stok, lokasi_awal, pengguna())
                     st.success('Produk berhasil ditambahkan!', icon="✅")
                     st.session_state.page_produk = 1
                     st.rerun()
@@ -128,7 +147,7 @@ def main():
             st.info("Tidak ada produk yang sesuai kriteria", icon="🔍")
         else:
             st.info(
-                "Tidak ada produk tersedia. Silakan tambah produk terlebih dahulu.", icon="텅")
+                "Tidak ada produk tersedia. Silakan tambah produk terlebih dahulu.", icon="📭")
     else:
         df_produk = pd.DataFrame(
             produk, columns=["ID", "Nama", "Stok", "Satuan"])
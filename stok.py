@@ -0,0 +1,272 @@
+from datetime import date, timedelta
+
+import streamlit as st
+
+import arsip
+import perubahan
+from database import LOKASI_UTAMA
+
+# Operasi mutasi stok. Semua fungsi menerima koneksi/cursor dan dipanggil di
+# dalam transaksi milik pemanggil (mis. `with conn:`), sehingga saldo per
+# lokasi, lot, total produk.stok, ledger dan log perubahan selalu berubah
+# bersamaan.
+
+# Urutan FEFO lalu FIFO; harus sama persis dengan ekspresi idx_lot_terbuka
+URUTAN_LOT = "COALESCE(kedaluwarsa, '9999-12-31'), tanggal, id"
+# Lot yang belum kedaluwarsa pada suatu tanggal; rentang pada kolom indeks yang sama
+LOT_LAYAK = "COALESCE(kedaluwarsa, '9999-12-31') >= ?"
+
+
+def daftar_lokasi(conn):
+    return conn.execute("SELECT id, nama FROM lokasi ORDER BY id").fetchall()
+
+
+def pilih_lokasi(conn, label="📍 Lokasi", key=None, semua=True, help=None):
+    # Selectbox lokasi; mengembalikan None untuk "Semua Lokasi"
+    lokasi = daftar_lokasi(conn)
+    opsi = ([None] if semua else []) + [l[0] for l in lokasi]
+    nama = dict(lokasi)
+    return st.selectbox(
+        label,
+        opsi,
+        format_func=lambda x: "Semua Lokasi" if x is None else nama[x],
+        key=key,
+        help=help
+    )
+
+
+def stok_di(c, produk_id, lokasi_id):
+    row = c.execute(
+        "SELECT stok FROM stok_lokasi WHERE produk_id = ? AND lokasi_id = ?",
+        (produk_id, lokasi_id)).fetchone()
+    return row[0] if row else 0
+
+
+def _tambah_saldo(c, produk_id, lokasi_id, jumlah):
+    c.execute('''INSERT INTO stok_lokasi (produk_id, lokasi_id, stok) VALUES (?, ?, ?)
+                 ON CONFLICT(produk_id, lokasi_id) DO UPDATE SET stok = stok + excluded.stok''',
+              (produk_id, lokasi_id, jumlah))
+
+
+def _kurangi_saldo(c, produk_id, lokasi_id, jumlah):
+    diubah = c.execute(
+        "UPDATE stok_lokasi SET stok = stok - ? "
+        "WHERE produk_id = ? AND lokasi_id = ? AND stok >= ?",
+        (jumlah, produk_id, lokasi_id, jumlah)).rowcount
+    if not diubah:
+        raise ValueError("Stok di lokasi ini tidak mencukupi")
+
+
+def _buat_lot(c, produk_id, lokasi_id, jumlah, tanggal, kode=None, kedaluwarsa=None,
+              masuk_id=None, asal_lot_id=None):
+    cur = c.execute(
+        '''INSERT INTO lot (produk_id, lokasi_id, kode, kedaluwarsa, tanggal, jumlah, sisa,
+                            masuk_id, asal_lot_id)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        (produk_id, lokasi_id, kode or None, kedaluwarsa, tanggal, jumlah, jumlah,
+         masuk_id, asal_lot_id))
+    return cur.lastrowid
+
+
+def _ambil_lot(c, produk_id, lokasi_id, jumlah, tanggal=None):
+    # Alokasi FEFO/FIFO: tiap langkah satu pencarian indeks ke lot terbuka
+    # berikutnya, jadi biayanya O(log n) per lot yang tersentuh. Dengan tanggal,
+    # lot yang sudah kedaluwarsa pada tanggal itu dilewati
+    query = "SELECT id, sisa FROM lot WHERE produk_id = ? AND lokasi_id = ? AND sisa > 0"
+    params = (produk_id, lokasi_id)
+    if tanggal is not None:
+        query += " AND " + LOT_LAYAK
+        params += (str(tanggal)[:10],)
+    diambil = []
+    while jumlah > 0:
+        row = c.execute(f"{query} ORDER BY {URUTAN_LOT} LIMIT 1", params).fetchone()
+        if row is None:
+            # Saldo lokasi sudah lolos pengecekan; lot kurang berarti data tidak konsisten
+            raise RuntimeError("Saldo lot tidak sesuai dengan stok lokasi")
+        lot_id, sisa = row
+        ambil = min(sisa, jumlah)
+        c.execute("UPDATE lot SET sisa = sisa - ? WHERE id = ?", (ambil, lot_id))
+        diambil.append((lot_id, ambil))
+        jumlah -= ambil
+    return diambil
+
+
+def lot_terbuka(c, produk_id, lokasi_id, tanggal=None):
+    # Cursor lot terbuka dalam urutan alokasi (dibaca seperlunya oleh pemanggil);
+    # dengan tanggal hanya lot yang masih boleh dijual pada tanggal itu
+    query = ("SELECT id, kode, kedaluwarsa, tanggal, sisa FROM lot "
+             "WHERE produk_id = ? AND lokasi_id = ? AND sisa > 0")
+    params = (produk_id, lokasi_id)
+    if tanggal is not None:
+        query += " AND " + LOT_LAYAK
+        params += (str(tanggal)[:10],)
+    return c.execute(f"{query} ORDER BY {URUTAN_LOT}", params)
+
+
+def stok_layak(c, produk_id, lokasi_id, tanggal):
+    # Stok lokasi yang belum kedaluwarsa pada tanggal tertentu
+    return c.execute(
+        f"SELECT COALESCE(SUM(sisa), 0) FROM lot "
+        f"WHERE produk_id = ? AND lokasi_id = ? AND sisa > 0 AND {LOT_LAYAK}",
+        (produk_id, lokasi_id, str(tanggal)[:10])).fetchone()[0]
+
+
+def lot_kedaluwarsa(c, produk_id, lokasi_id, tanggal):
+    # Lot terbuka yang sudah kedaluwarsa pada tanggal tertentu
+    return c.execute(
+        "SELECT id, kode, kedaluwarsa, sisa FROM lot "
+        "WHERE produk_id = ? AND lokasi_id = ? AND sisa > 0 AND kedaluwarsa < ? "
+        "ORDER BY kedaluwarsa, id",
+        (produk_id, lokasi_id, str(tanggal)[:10])).fetchall()
+
+
+def lot_mendekati_kedaluwarsa(conn, hari, lokasi_id=None):
+    # Lot terbuka yang kedaluwarsa dalam N hari (termasuk yang sudah lewat)
+    batas = (date.today() + timedelta(days=int(hari))).isoformat()
+    query = '''
+        SELECT l.id, p.nama, lk.nama, l.kode, l.kedaluwarsa, l.sisa, p.satuan
+        FROM lot l
+        JOIN produk p ON l.produk_id = p.id
+        JOIN lokasi lk ON l.lokasi_id = lk.id
+        WHERE l.sisa > 0 AND l.kedaluwarsa IS NOT NULL AND l.kedaluwarsa <= ?'''
+    params = (batas,)
+    if lokasi_id is not None:
+        query += " AND l.lokasi_id = ?"
+        params += (lokasi_id,)
+    return conn.execute(query + " ORDER BY l.kedaluwarsa, l.id", params).fetchall()
+
+
+def telusuri_keluar(conn, keluar_id):
+    # Lot dan transaksi masuk asal sebuah transaksi keluar; transaksi, alokasi
+    # dan transaksi masuk yang sudah diarsipkan ikut dibaca dari arsip tahunan
+    keluar = arsip.cari(conn, 'transaksi_keluar', 'id', keluar_id)
+    if not keluar:
+        return None
+    alokasi = []
+    for a in arsip.cari(conn, 'alokasi_lot', 'keluar_id', keluar_id):
+        kode, kedaluwarsa, lokasi_id, masuk_id = conn.execute(
+            "SELECT kode, kedaluwarsa, lokasi_id, masuk_id FROM lot WHERE id = ?",
+            (a['lot_id'],)).fetchone()
+        masuk = arsip.cari(conn, 'transaksi_masuk', 'id', masuk_id) if masuk_id else []
+        alokasi.append({'lot_id': a['lot_id'], 'jumlah': a['jumlah'], 'kode': kode,
+                        'kedaluwarsa': kedaluwarsa, 'lokasi_id': lokasi_id,
+                        'masuk': masuk[0] if masuk else None})
+    return {'keluar': keluar[0], 'alokasi': alokasi}
+
+
+def tambah_lokasi(c, nama, pengguna=None):
+    lokasi_id = c.execute("INSERT INTO lokasi (nama) VALUES (?)", (nama,)).lastrowid
+    perubahan.catat(c, 'lokasi', 'tambah', lokasi_id, {'nama': nama}, pengguna)
+    return lokasi_id
+
+
+def tambah_produk(c, nama, satuan, stok, lokasi_id=LOKASI_UTAMA, pengguna=None):
+    cur = c.execute("INSERT INTO produk (nama, stok, satuan) VALUES (?, ?, ?)",
+                    (nama, stok, satuan))
+    produk_id = cur.lastrowid
+    _tambah_saldo(c, produk_id, lokasi_id, stok)
+    lot_id = None
+    if stok > 0:
+        lot_id = _buat_lot(c, produk_id, lokasi_id, stok, date.today(), kode='SALDO-AWAL')
+    perubahan.catat(c, 'produk', 'tambah', produk_id, {
+        'nama': nama, 'satuan': satuan, 'stok': stok, 'lokasi_id': lokasi_id,
+        'lot_id': lot_id}, pengguna)
+    return produk_id
+
+
+def _rekap_bulan_arsip(c, produk_id, lokasi_id, tanggal, masuk=0, keluar=0):
+    # Bulan yang sudah diarsipkan dibaca dari rekap_bulanan (mis. prediksi),
+    # jadi transaksi bertanggal mundur langsung ditambahkan ke rekapnya
+    batas = arsip.batas_arsip(c)
+    if batas is None or str(tanggal) >= batas:
+        return
+    c.execute(
+        '''INSERT INTO rekap_bulanan (produk_id, lokasi_id, bulan, masuk, keluar)
+           VALUES (?, ?, ?, ?, ?)
+           ON CONFLICT(produk_id, lokasi_id, bulan) DO UPDATE SET
+               masuk = masuk + excluded.masuk, keluar = keluar + excluded.keluar''',
+        (produk_id, lokasi_id, str(tanggal)[:7], masuk, keluar))
+
+
+def catat_masuk(c, produk_id, jumlah, tanggal, lokasi_id=LOKASI_UTAMA,
+                kode=None, kedaluwarsa=None, pengguna=None):
+    # Setiap penerimaan membentuk satu lot baru
+    cur = c.execute(
+        "INSERT INTO transaksi_masuk (produk_id, jumlah, tanggal, lokasi_id) VALUES (?, ?, ?, ?)",
+        (produk_id, jumlah, tanggal, lokasi_id))
+    lot_id = _buat_lot(c, produk_id, lokasi_id, jumlah, tanggal, kode, kedaluwarsa,
+                       masuk_id=cur.lastrowid)
+    _tambah_saldo(c, produk_id, lokasi_id, jumlah)
+    c.execute("UPDATE produk SET stok = stok + ? WHERE id = ?", (jumlah, produk_id))
+    _rekap_bulan_arsip(c, produk_id, lokasi_id, tanggal, masuk=jumlah)
+    perubahan.catat(c, 'transaksi_masuk', 'tambah', cur.lastrowid, {
+        'produk_id': produk_id, 'lokasi_id': lokasi_id, 'jumlah': jumlah,
+        'tanggal': tanggal, 'lot_id': lot_id, 'kode': kode or None,
+        'kedaluwarsa': kedaluwarsa}, pengguna)
+    return cur.lastrowid
+
+
+def catat_keluar(c, produk_id, jumlah, tanggal, lokasi_id=LOKASI_UTAMA, pengguna=None):
+    _kurangi_saldo(c, produk_id, lokasi_id, jumlah)
+    # Lot yang kedaluwarsa pada tanggal transaksi tidak dijual (keluarkan lewat
+    # hapus_kedaluwarsa). Saldo dikembalikan dulu agar transaksi pemanggil
+    # tetap bersih bila ia menangkap ValueError dan melanjutkan (mis. impor)
+    if stok_layak(c, produk_id, lokasi_id, tanggal) < jumlah:
+        _tambah_saldo(c, produk_id, lokasi_id, jumlah)
+        raise ValueError("Stok yang belum kedaluwarsa tidak mencukupi")
+    cur = c.execute(
+        "INSERT INTO transaksi_keluar (produk_id, jumlah, tanggal, lokasi_id) VALUES (?, ?, ?, ?)",
+        (produk_id, jumlah, tanggal, lokasi_id))
+    alokasi = _ambil_lot(c, produk_id, lokasi_id, jumlah, tanggal)
+    c.executemany(
+        "INSERT INTO alokasi_lot (keluar_id, lot_id, jumlah) VALUES (?, ?, ?)",
+        [(cur.lastrowid, lot_id, ambil) for lot_id, ambil in alokasi])
+    c.execute("UPDATE produk SET stok = stok - ? WHERE id = ?", (jumlah, produk_id))
+    _rekap_bulan_arsip(c, produk_id, lokasi_id, tanggal, keluar=jumlah)
+    perubahan.catat(c, 'transaksi_keluar', 'tambah', cur.lastrowid, {
+        'produk_id': produk_id, 'lokasi_id': lokasi_id, 'jumlah': jumlah,
+        'tanggal': tanggal, 'alokasi': alokasi}, pengguna)
+    return cur.lastrowid
+
+
+def hapus_kedaluwarsa(c, produk_id, lokasi_id, tanggal, pengguna=None):
+    # Penghapusan (write-off) semua lot yang kedaluwarsa pada tanggal tersebut.
+    # Bukan penjualan, jadi tidak dicatat di transaksi_keluar (dan tidak ikut
+    # rekap/prediksi); jejaknya ada di log perubahan
+    lot = [(lot_id, sisa) for lot_id, _, _, sisa in lot_kedaluwarsa(c, produk_id, lokasi_id, tanggal)]
+    jumlah = sum(sisa for _, sisa in lot)
+    if not jumlah:
+        return 0
+    _kurangi_saldo(c, produk_id, lokasi_id, jumlah)
+    c.executemany("UPDATE lot SET sisa = 0 WHERE id = ?", [(lot_id,) for lot_id, _ in lot])
+    c.execute("UPDATE produk SET stok = stok - ? WHERE id = ?", (jumlah, produk_id))
+    perubahan.catat(c, 'lot', 'hapus_kedaluwarsa', None, {
+        'produk_id': produk_id, 'lokasi_id': lokasi_id, 'jumlah': jumlah,
+        'tanggal': tanggal, 'lot': lot}, pengguna)
+    return jumlah
+
+
+def transfer(c, produk_id, dari_lokasi_id, ke_lokasi_id, jumlah, tanggal, pengguna=None):
+    # Pindah stok antar lokasi; total produk.stok tidak berubah
+    if dari_lokasi_id == ke_lokasi_id:
+        raise ValueError("Lokasi asal dan tujuan harus berbeda")
+    _kurangi_saldo(c, produk_id, dari_lokasi_id, jumlah)
+    _tambah_saldo(c, produk_id, ke_lokasi_id, jumlah)
+    # Lot ikut berpindah dengan kode dan kedaluwarsa yang sama
+    lot = []
+    for lot_id, ambil in _ambil_lot(c, produk_id, dari_lokasi_id, jumlah):
+        kode, kedaluwarsa, tgl_lot, masuk_id = c.execute(
+            "SELECT kode, kedaluwarsa, tanggal, masuk_id FROM lot WHERE id = ?",
+            (lot_id,)).fetchone()
+        lot_baru = _buat_lot(c, produk_id, ke_lokasi_id, ambil, tgl_lot, kode, kedaluwarsa,
+                             masuk_id=masuk_id, asal_lot_id=lot_id)
+        lot.append((lot_id, lot_baru, ambil))
+    cur = c.execute(
+        '''INSERT INTO transfer_stok (produk_id, dari_lokasi_id, ke_lokasi_id, jumlah, tanggal)
+           VALUES (?, ?, ?, ?, ?)''',
+        (produk_id, dari_lokasi_id, ke_lokasi_id, jumlah, tanggal))
+    perubahan.catat(c, 'transfer_stok', 'tambah', cur.lastrowid, {
+        'produk_id': produk_id, 'dari_lokasi_id': dari_lokasi_id,
+        'ke_lokasi_id': ke_lokasi_id, 'jumlah': jumlah, 'tanggal': tanggal,
+        'lot': lot}, pengguna)
+    return cur.lastrowid
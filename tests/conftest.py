@@ -0,0 +1,48 @@
+import time
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import database
+import tugas
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Database sementara per pengujian; arsip, cadangan dan impor ikut ke tmp_path
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'stok.db'))
+    database.init_db()
+    st.cache_data.clear()
+    yield database.DB_PATH
+    # Jangan tinggalkan pengerja tugas yang masih menulis ke database sementara
+    conn = database.koneksi()
+    try:
+        while conn.execute("SELECT COUNT(*) FROM tugas WHERE status IN (?, ?)",
+                           tugas.STATUS_AKTIF).fetchone()[0]:
+            time.sleep(0.1)
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def conn(db):
+    conn = database.koneksi()
+    yield conn
+    conn.close()
+
+
+def halaman(modul):
+    # Jalankan main() sebuah halaman lewat AppTest
+    return AppTest.from_string(f"from {modul} import main\nmain()", default_timeout=60)
+
+
+def tunggu_tugas(kunci, batas=60):
+    # Tunggu tugas latar belakang dengan kunci tertentu selesai
+    mulai = time.time()
+    while time.time() - mulai < batas:
+        info = tugas.terakhir(kunci)
+        if info and info['status'] not in tugas.STATUS_AKTIF:
+            return info
+        time.sleep(0.1)
+    raise TimeoutError(f"Tugas {kunci} tidak selesai")
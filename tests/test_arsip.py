@@ -0,0 +1,192 @@
+from datetime import date
+
+import pytest
+
+import arsip
+import database
+import stok
+from conftest import halaman
+from prediksi import data_bulanan
+
+
+@pytest.fixture
+def riwayat(conn):
+    # Transaksi bulanan 2019-2021 (diarsipkan) ditambah satu transaksi baru
+    with conn:
+        pid = stok.tambah_produk(conn, 'Beras', 'Kg', 0)
+        for tahun in (2019, 2020, 2021):
+            for bulan in (1, 6, 12):
+                tanggal = f"{tahun}-{bulan:02d}-15"
+                stok.catat_masuk(conn, pid, 10, tanggal)
+                stok.catat_keluar(conn, pid, bulan, tanggal)
+        stok.catat_keluar(conn, pid, 1, arsip.batas_bulan(0).isoformat())
+    arsip.perbarui_rekap(conn)
+    return pid
+
+
+def rencana(conn, query, params=()):
+    return ' '.join(r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + query, params))
+
+
+def test_arsip_memakai_indeks_periode_dan_lokasi(conn, riwayat):
+    arsip.arsipkan(12)
+    sumber = arsip.sumber(conn, 'transaksi_keluar', '2020-01-01', '2020-12-31')
+    plan = rencana(conn, f"SELECT COUNT(*) FROM {sumber} WHERE tanggal >= ? AND tanggal < ?",
+                   ('2020-01-01', '2021-01-01'))
+    assert 'SCAN arsip_2020' not in plan
+    plan = rencana(conn, f"SELECT COUNT(*) FROM {sumber} "
+                         f"WHERE tanggal >= ? AND tanggal < ? AND lokasi_id = ?",
+                   ('2020-01-01', '2021-01-01', 1))
+    assert 'idx_transaksi_keluar_lokasi_tanggal' in plan
+
+
+def rekap(conn):
+    return conn.execute("SELECT produk_id, lokasi_id, bulan, masuk, keluar "
+                        "FROM rekap_bulanan ORDER BY bulan").fetchall()
+
+
+def test_arsipkan_dapat_diulang(conn, riwayat):
+    sebelum = rekap(conn)
+    hasil = arsip.arsipkan(12)
+    assert hasil['tahun'] == [2019, 2020, 2021]
+    assert hasil['dipindah'] == 18
+    # Dijalankan ulang: tidak ada yang dipindah, arsip tidak berlipat
+    assert arsip.arsipkan(12)['dipindah'] == 0
+    ringkas = arsip.ringkasan(conn)
+    assert [(r['Tahun'], r['Masuk'], r['Keluar']) for r in ringkas] == [
+        (2019, 3, 3), (2020, 3, 3), (2021, 3, 3)]
+    assert conn.execute("SELECT COUNT(*) FROM transaksi_keluar").fetchone()[0] == 1
+    # Rekap bulanan tetap sama setelah data pindah ke arsip
+    assert rekap(conn) == sebelum
+    arsip.perbarui_rekap(conn)
+    assert rekap(conn) == sebelum
+
+
+def test_sumber_lintas_tahun(conn, riwayat):
+    arsip.arsipkan(12)
+    src = arsip.sumber(conn, 'transaksi_keluar', '2019-06-01', '2021-01-31')
+    baris = conn.execute(f"SELECT tanggal, jumlah FROM {src} "
+                         f"WHERE tanggal >= ? AND tanggal < ? ORDER BY tanggal",
+                         ('2019-06-01', '2021-02-01')).fetchall()
+    assert baris == [('2019-06-15', 6), ('2019-12-15', 12), ('2020-01-15', 1),
+                     ('2020-06-15', 6), ('2020-12-15', 12), ('2021-01-15', 1)]
+    # Rentang tanpa arsip hanya membaca tabel utama
+    assert arsip.sumber(conn, 'transaksi_keluar', arsip.batas_bulan(0)) == 'transaksi_keluar'
+
+
+def test_dashboard_menghitung_arsip(conn, riwayat):
+    arsip.arsipkan(12)
+    at = halaman('dashboard')
+    at.run()
+    assert not at.exception
+    nilai = {m.label: m.value for m in at.metric}
+    assert nilai["📥 Transaksi Masuk"] == '9'
+    assert nilai["📤 Transaksi Keluar"] == '10'
+
+
+def test_lebih_dari_batas_attach(conn):
+    # 12 file arsip tahunan melebihi SQLITE_LIMIT_ATTACHED (10)
+    with conn:
+        pid = stok.tambah_produk(conn, 'Beras', 'Kg', 0)
+        for tahun in range(2010, 2022):
+            stok.catat_masuk(conn, pid, 5, f"{tahun}-03-01")
+            stok.catat_keluar(conn, pid, 2, f"{tahun}-03-02")
+    hasil = arsip.arsipkan(12)
+    assert hasil['tahun'] == list(range(2010, 2022))
+    assert len(arsip.ringkasan(conn)) == 12
+    assert arsip.perbarui_rekap(conn) == 12
+    assert conn.execute("SELECT SUM(keluar) FROM rekap_bulanan").fetchone()[0] == 24
+    assert not arsip._terpasang(conn)
+
+    bulanan = data_bulanan(conn, pid)
+    assert bulanan['jumlah'].sum() == 24
+    assert bulanan['tanggal'].iloc[0].strftime('%Y-%m') == '2010-03'
+
+    with pytest.raises(ValueError):
+        arsip.sumber(conn, 'transaksi_keluar', '2010-01-01', '2021-12-31')
+    mulai, dipotong = arsip.batasi_rentang(conn, date(2010, 1, 1), date(2021, 12, 31))
+    assert dipotong and mulai == date(2021 - arsip.MAKS_TAHUN_ARSIP + 1, 1, 1)
+    src = arsip.sumber(conn, 'transaksi_keluar', mulai, '2021-12-31')
+    assert conn.execute(f"SELECT SUM(jumlah) FROM {src}").fetchone()[0] == 2 * arsip.MAKS_TAHUN_ARSIP
+
+
+def test_telusuri_keluar_lintas_arsip(conn):
+    with conn:
+        toko = stok.tambah_lokasi(conn, 'Toko')
+        pid = stok.tambah_produk(conn, 'Susu', 'Pcs', 0)
+        masuk = stok.catat_masuk(conn, pid, 10, '2020-03-01', kode='B-01',
+                                 kedaluwarsa='2030-01-01')
+        stok.transfer(conn, pid, 1, toko, 4, '2020-04-01')
+        lama = stok.catat_keluar(conn, pid, 2, '2020-05-01', toko)
+        baru = stok.catat_keluar(conn, pid, 3, arsip.batas_bulan(0).isoformat())
+    arsip.arsipkan(12)
+    assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+    assert conn.execute("SELECT COUNT(*) FROM alokasi_lot").fetchone()[0] == 1
+
+    jejak = stok.telusuri_keluar(conn, lama)
+    assert (jejak['keluar']['jumlah'], jejak['keluar']['tanggal']) == (2, '2020-05-01')
+    (alokasi,) = jejak['alokasi']
+    assert (alokasi['kode'], alokasi['lokasi_id'], alokasi['jumlah']) == ('B-01', toko, 2)
+    assert alokasi['masuk']['id'] == masuk
+    # Transaksi keluar aktif tetap menemukan transaksi masuk yang sudah diarsipkan
+    (alokasi,) = stok.telusuri_keluar(conn, baru)['alokasi']
+    assert alokasi['masuk']['tanggal'] == '2020-03-01'
+    assert stok.telusuri_keluar(conn, 999) is None
+    assert not arsip._terpasang(conn)
+
+
+def test_migrasi_lot_tanpa_rujukan_transaksi_masuk(conn):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Susu', 'Pcs', 0)
+        stok.catat_masuk(conn, pid, 5, '2024-01-01', kode='A')
+        stok.catat_keluar(conn, pid, 2, '2024-01-02')
+        # Skema lama: lot.masuk_id dengan FOREIGN KEY ke transaksi_masuk
+        ddl = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'lot'").fetchone()[0]
+        conn.execute("PRAGMA legacy_alter_table = ON")
+        conn.execute("ALTER TABLE lot RENAME TO lot_tmp")
+        conn.execute(ddl.replace("FOREIGN KEY(asal_lot_id)",
+                                 "FOREIGN KEY(masuk_id) REFERENCES transaksi_masuk(id), "
+                                 "FOREIGN KEY(asal_lot_id)"))
+        conn.execute("INSERT INTO lot SELECT * FROM lot_tmp")
+        conn.execute("DROP TABLE lot_tmp")
+    database.init_db()
+    assert {fk[2] for fk in conn.execute("PRAGMA foreign_key_list(lot)")} == {
+        'lot', 'lokasi', 'produk'}
+    assert {fk[2] for fk in conn.execute("PRAGMA foreign_key_list(alokasi_lot)")} == {
+        'lot', 'transaksi_keluar'}
+    assert conn.execute("SELECT kode, sisa FROM lot").fetchall() == [('A', 3)]
+    assert stok.telusuri_keluar(conn, 1)['alokasi'][0]['masuk']['jumlah'] == 5
+
+
+def test_transaksi_mundur_setelah_arsip_masuk_rekap(conn, riwayat):
+    arsip.arsipkan(12)
+    sebelum = data_bulanan(conn, riwayat)['jumlah'].sum()
+    with conn:
+        stok.catat_masuk(conn, riwayat, 50, '2020-03-01')
+        stok.catat_keluar(conn, riwayat, 50, '2020-03-10')
+    bulanan = data_bulanan(conn, riwayat)
+    assert bulanan['jumlah'].sum() == sebelum + 50
+    assert bulanan.loc[bulanan['tanggal'] == '2020-03-31', 'jumlah'].item() == 50
+    # Membangun ulang rekap dari data utama + arsip memberi hasil yang sama
+    rekap_sekarang = rekap(conn)
+    arsip.perbarui_rekap(conn)
+    assert rekap(conn) == rekap_sekarang
+
+
+@pytest.mark.parametrize('mode_awal', [2, 0])
+def test_arsipkan_mengecilkan_database(conn, mode_awal):
+    if mode_awal == 0:
+        # Database yang dibuat sebelum auto_vacuum diaktifkan
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.execute("PRAGMA auto_vacuum = NONE")
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA journal_mode = WAL")
+    with conn:
+        pid = stok.tambah_produk(conn, 'Beras', 'Kg', 0)
+        for i in range(2000):
+            stok.catat_masuk(conn, pid, 1, '2020-01-01', kode=f"BATCH-{i:05d}")
+    halaman_awal = conn.execute("PRAGMA page_count").fetchone()[0]
+    arsip.arsipkan(12)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == mode_awal
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    assert conn.execute("PRAGMA page_count").fetchone()[0] < halaman_awal
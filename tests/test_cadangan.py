@@ -0,0 +1,112 @@
+from datetime import date
+import os
+import time
+
+import pytest
+
+import arsip
+import cadangan
+import database
+import stok
+import tugas
+from conftest import halaman, tunggu_tugas
+
+
+def test_cadangan_lewat_tugas_tetap_bertahap(conn, monkeypatch):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Beras', 'Kg', 0)
+        for i in range(200):
+            stok.catat_masuk(conn, pid, 1, '2024-01-01', kode=f"B{i}")
+    # Satu halaman per langkah: setiap tulisan ke database selama penyalinan
+    # langsung memaksa salin sekaligus
+    monkeypatch.setattr(cadangan, 'HALAMAN_PER_LANGKAH', 1)
+    monkeypatch.setattr(cadangan, 'JEDA_LANGKAH', 0)
+    monkeypatch.setattr(cadangan, 'MAKS_ULANG', 1)
+    tugas.kirim('cadangan', kunci='cadangan')
+    info = tunggu_tugas('cadangan')
+    assert info['status'] == 'selesai', info['pesan']
+    assert info['hasil']['ulang'] == 0
+    assert not info['hasil']['sekaligus']
+
+
+@pytest.mark.parametrize('dengan_manifest', [True, False])
+def test_pulihkan_tidak_menggandakan_arsip(conn, monkeypatch, dengan_manifest):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Beras', 'Kg', 0)
+        for bulan in range(1, 7):
+            stok.catat_masuk(conn, pid, 10, f"2020-{bulan:02d}-01")
+            stok.catat_keluar(conn, pid, bulan, f"2020-{bulan:02d}-02")
+    # Arsipkan Januari-Maret, cadangkan, lalu arsipkan sisa tahun 2020
+    monkeypatch.setattr(arsip, 'batas_bulan', lambda bulan: date(2020, 4, 1))
+    arsip.arsipkan()
+    nama = cadangan.buat_cadangan()['nama']
+    if not dengan_manifest:
+        # Cadangan dari sebelum arsip ikut dicadangkan
+        os.remove(cadangan._path_manifest(nama))
+    monkeypatch.setattr(arsip, 'batas_bulan', lambda bulan: date(2021, 1, 1))
+    arsip.arsipkan()
+    assert conn.execute("SELECT COUNT(*) FROM transaksi_keluar").fetchone()[0] == 0
+
+    # April-Juni kembali ke tabel utama dan hanya dihitung sekali: arsip ikut
+    # dipulihkan, atau (tanpa manifest) barisnya dibuang dari arsip
+    hasil = cadangan.pulihkan(nama)
+    assert hasil['duplikat_arsip'] == (0 if dengan_manifest else 6)
+    for tabel, jumlah in (('transaksi_masuk', 60), ('transaksi_keluar', 21)):
+        src = arsip.sumber(conn, tabel, '2020-01-01', '2020-12-31')
+        assert conn.execute(f"SELECT SUM(jumlah) FROM {src}").fetchone()[0] == jumlah
+    assert [(r['Masuk'], r['Keluar']) for r in arsip.ringkasan(conn)] == [(3, 3)]
+    arsip.arsipkan()
+    assert [(r['Masuk'], r['Keluar']) for r in arsip.ringkasan(conn)] == [(6, 6)]
+
+
+def test_cadangan_menyertakan_arsip(conn, monkeypatch):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Beras', 'Kg', 0)
+        stok.catat_masuk(conn, pid, 10, '2019-05-01')
+        stok.catat_masuk(conn, pid, 20, '2020-05-01')
+    arsip.arsipkan(12)
+    pertama = cadangan.buat_cadangan()
+    assert sorted(pertama['arsip']) == sorted(
+        a['berkas'] for a in cadangan._baca_manifest(pertama['nama']))
+    assert len(pertama['arsip']) == 2
+    # Arsip yang tidak berubah tidak disalin ulang
+    assert cadangan.buat_cadangan()['arsip'] == pertama['arsip']
+
+    # File arsip hilang: pemulihan mengembalikannya bersama database
+    os.remove(arsip.path_arsip(2019))
+    cadangan.pulihkan(pertama['nama'])
+    src = arsip.sumber(conn, 'transaksi_masuk', '2019-01-01', '2020-12-31')
+    assert conn.execute(f"SELECT SUM(jumlah) FROM {src}").fetchone()[0] == 30
+
+    # Retensi menghapus cadangan arsip yang tidak lagi dirujuk
+    folder = database.path_data(cadangan.DIR_CADANGAN, cadangan.DIR_ARSIP)
+    with conn:
+        stok.catat_masuk(conn, pid, 5, '2020-06-01')
+    arsip.arsipkan(12)
+    terbaru = cadangan.buat_cadangan()
+    assert len(os.listdir(folder)) == 3
+    cadangan.bersihkan(retensi=1)
+    assert sorted(os.listdir(folder)) == sorted(terbaru['arsip'])
+
+
+def test_kegagalan_penjadwal_tercatat(db, monkeypatch, caplog):
+    def _gagal():
+        raise OSError("disk penuh")
+
+    monkeypatch.setattr(cadangan, 'buat_cadangan', _gagal)
+    thread = cadangan.mulai_penjadwal(interval_jam=1)
+    try:
+        for _ in range(100):
+            if cadangan.status_penjadwal():
+                break
+            time.sleep(0.05)
+    finally:
+        cadangan.hentikan_penjadwal()
+        thread.join(5)
+    assert cadangan.status_penjadwal()['pesan'] == "disk penuh"
+    assert "Cadangan terjadwal gagal" in caplog.text
+
+    at = halaman('pemeliharaan')
+    at.run()
+    assert not at.exception
+    assert any("disk penuh" in e.value for e in at.error)
@@ -0,0 +1,177 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import stok
+from database import LOKASI_UTAMA
+from conftest import halaman
+
+HALAMAN = ['dashboard', 'produk', 'transaksi_masuk', 'transaksi_keluar',
+           'prediksi', 'lokasi', 'pemeliharaan']
+
+
+@pytest.fixture
+def isi(conn):
+    # 12 produk, satu di antaranya dengan 18 bulan transaksi
+    with conn:
+        conn.execute("INSERT INTO lokasi (nama) VALUES ('Toko Cabang')")
+        ids = [stok.tambah_produk(conn, f"Produk {i:02d}", 'Pcs', 100) for i in range(12)]
+        for i, tanggal in enumerate(pd.date_range('2023-01-15', periods=18, freq='MS')):
+            tanggal = tanggal.strftime('%Y-%m-%d')
+            stok.catat_masuk(conn, ids[0], 20, tanggal, kode=f"L{i}",
+                             kedaluwarsa='2000-01-01' if i == 0 else None)
+            stok.catat_keluar(conn, ids[0], 10 + i % 5, tanggal)
+    return ids
+
+
+def tombol(at, label):
+    return next(b for b in at.button if b.label == label)
+
+
+def lompat(at):
+    return next(n for n in at.number_input if n.label == "Lompat ke halaman")
+
+
+def halaman_info(at):
+    return next(m.value for m in at.markdown if m.value.startswith("Halaman "))
+
+
+@pytest.mark.parametrize('modul', HALAMAN)
+def test_halaman_kosong(db, modul):
+    at = halaman(modul)
+    at.run()
+    assert not at.exception
+
+
+@pytest.mark.parametrize('modul', HALAMAN)
+def test_halaman_berisi(isi, modul):
+    at = halaman(modul)
+    at.run()
+    assert not at.exception
+    # Filter lokasi diganti ke lokasi kedua
+    for sb in at.selectbox:
+        if sb.key and sb.key.startswith('lokasi') and None in sb.options:
+            sb.set_value(2)
+    at.run()
+    assert not at.exception
+
+
+@pytest.mark.parametrize('modul', ['produk', 'transaksi_masuk', 'transaksi_keluar'])
+def test_paginasi_tabel_kosong(conn, modul):
+    if modul != 'produk':
+        # Halaman transaksi membutuhkan produk, tapi riwayatnya kosong
+        with conn:
+            stok.tambah_produk(conn, 'Beras', 'Kg', 10)
+    at = halaman(modul)
+    at.run()
+    assert not at.exception
+    assert halaman_info(at) == "Halaman 1 dari 0"
+    assert tombol(at, "⬅️ Sebelumnya").disabled
+    assert tombol(at, "Selanjutnya ➡️").disabled
+    assert lompat(at).max == 1
+
+
+def test_paginasi_produk(isi):
+    at = halaman('produk')
+    at.run()
+    assert halaman_info(at) == "Halaman 1 dari 3"
+    tombol(at, "Selanjutnya ➡️").click()
+    at.run()
+    tombol(at, "Selanjutnya ➡️").click()
+    at.run()
+    assert halaman_info(at) == "Halaman 3 dari 3"
+    assert tombol(at, "Selanjutnya ➡️").disabled
+    assert len(at.dataframe[0].value) == 2
+
+    # Filter yang mempersempit hasil mengembalikan halaman ke batas yang valid
+    at.text_input[0].set_value("Produk 01")
+    at.run()
+    assert not at.exception
+    assert halaman_info(at) == "Halaman 1 dari 1"
+    assert list(at.dataframe[0].value['Nama']) == ["Produk 01"]
+
+
+def test_form_tambah_produk(conn):
+    at = halaman('produk')
+    at.run()
+    next(t for t in at.text_input if t.label == "Nama Produk").set_value("Gula")
+    next(t for t in at.text_input if t.label == "Satuan").set_value("Kg")
+    next(n for n in at.number_input if n.label == "Stok Awal").set_value(12)
+    tombol(at, "Tambah Produk").click()
+    at.run()
+    assert not at.exception
+    assert conn.execute("SELECT nama, stok FROM produk").fetchall() == [("Gula", 12)]
+    assert conn.execute("SELECT SUM(sisa) FROM lot").fetchone()[0] == 12
+
+
+def test_form_transaksi_masuk(conn):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Susu', 'Pcs', 0)
+    at = halaman('transaksi_masuk')
+    at.run()
+    next(n for n in at.number_input if n.label == "Jumlah").set_value(8)
+    next(t for t in at.text_input if t.label == "Kode Batch").set_value("LOT-1")
+    next(d for d in at.date_input if d.label == "Tanggal Kedaluwarsa").set_value(date(2030, 1, 31))
+    tombol(at, "Tambah Transaksi").click()
+    at.run()
+    assert not at.exception
+    assert stok.stok_di(conn, pid, LOKASI_UTAMA) == 8
+    assert conn.execute("SELECT kode, kedaluwarsa, sisa FROM lot").fetchall() == [
+        ("LOT-1", "2030-01-31", 8)]
+
+
+def test_form_transaksi_keluar(conn):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Susu', 'Pcs', 10)
+    at = halaman('transaksi_keluar')
+    at.run()
+    next(n for n in at.number_input if n.label == "Jumlah").set_value(4)
+    at.run()
+    tombol(at, "Tambah Transaksi").click()
+    at.run()
+    assert not at.exception
+    assert conn.execute("SELECT stok FROM produk WHERE id = ?", (pid,)).fetchone()[0] == 6
+    assert conn.execute("SELECT SUM(jumlah) FROM alokasi_lot").fetchone()[0] == 4
+
+
+def test_keluar_batch_kedaluwarsa_perlu_konfirmasi(conn):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Susu', 'Pcs', 0)
+        stok.catat_masuk(conn, pid, 5, '2020-01-01', kode='LAMA', kedaluwarsa='2020-02-01')
+        stok.catat_masuk(conn, pid, 3, '2020-01-02', kode='BARU', kedaluwarsa='2099-01-01')
+    at = halaman('transaksi_keluar')
+    at.run()
+    assert not at.exception
+    assert any('kedaluwarsa' in w.value for w in at.warning)
+    assert next(n for n in at.number_input if n.label == "Jumlah").max == 3
+    assert tombol(at, "Hapus Batch Kedaluwarsa").disabled
+    at.checkbox(key="yakin_hapus_kedaluwarsa").check()
+    at.run()
+    tombol(at, "Hapus Batch Kedaluwarsa").click()
+    at.run()
+    assert not at.exception
+    assert conn.execute("SELECT stok FROM produk WHERE id = ?", (pid,)).fetchone()[0] == 3
+    assert conn.execute("SELECT COUNT(*) FROM transaksi_keluar").fetchone()[0] == 0
+    assert not any('kedaluwarsa' in w.value for w in at.warning)
+
+
+def test_form_transfer(isi, conn):
+    at = halaman('lokasi')
+    at.run()
+    at.selectbox(key="ke_transfer").set_value(2)
+    at.run()
+    next(n for n in at.number_input if n.label.startswith("Jumlah")).set_value(30)
+    tombol(at, "Transfer").click()
+    at.run()
+    assert not at.exception
+    assert stok.stok_di(conn, isi[0], 2) == 30
+    assert conn.execute("SELECT COUNT(*) FROM transfer_stok").fetchone()[0] == 1
+
+
+def test_dashboard_tugas_rekap_hilang(db):
+    # Id tugas di session bisa hilang, mis. setelah pemulihan cadangan
+    at = halaman('dashboard')
+    at.session_state['tugas_rekap'] = 9999
+    at.run()
+    assert not at.exception
@@ -0,0 +1,90 @@
+import os
+
+import pandas as pd
+import pytest
+
+import database
+import stok
+import tugas
+from conftest import halaman
+
+
+def tulis_csv(nama, baris):
+    os.makedirs(database.path_data(tugas.DIR_IMPOR), exist_ok=True)
+    path = database.path_data(tugas.DIR_IMPOR, nama)
+    with open(path, 'w') as f:
+        f.write("produk,jumlah,tanggal\n")
+        for produk, jumlah in baris:
+            f.write(f"{produk},{jumlah},2024-01-01\n")
+    return path
+
+
+def impor(path):
+    return tugas.HANDLER['impor']({'jenis': 'masuk', 'path': path}, lambda *a: None)
+
+
+def test_impor_gagal_dilanjutkan_tanpa_duplikasi(conn, monkeypatch):
+    with conn:
+        stok.tambah_produk(conn, 'Beras', 'Kg', 0)
+    monkeypatch.setattr(tugas, 'UKURAN_BATCH', 2)
+    baris = [('Beras', i) for i in range(1, 6)]
+
+    asli = stok.catat_masuk
+
+    def _gagal_di_baris_4(c, produk_id, jumlah, *args, **kwargs):
+        if jumlah == 4:
+            raise RuntimeError("koneksi terputus")
+        return asli(c, produk_id, jumlah, *args, **kwargs)
+
+    monkeypatch.setattr(stok, 'catat_masuk', _gagal_di_baris_4)
+    path = tulis_csv('masuk-uji.csv', baris)
+    with pytest.raises(RuntimeError):
+        impor(path)
+    # Berkas sementara dibersihkan walau gagal; batch pertama tetap tersimpan
+    assert not os.path.exists(path)
+    assert conn.execute("SELECT SUM(jumlah) FROM transaksi_masuk").fetchone()[0] == 1 + 2
+
+    monkeypatch.setattr(stok, 'catat_masuk', asli)
+    hasil = impor(tulis_csv('masuk-uji.csv', baris))
+    assert hasil['dilanjutkan_dari'] == 2
+    assert hasil['berhasil'] == 5
+    assert conn.execute("SELECT SUM(jumlah) FROM transaksi_masuk").fetchone()[0] == 15
+
+    # Berkas yang sama diunggah ulang setelah selesai tidak diimpor lagi
+    hasil = impor(tulis_csv('masuk-uji.csv', baris))
+    assert hasil['sudah_diimpor']
+    assert conn.execute("SELECT stok FROM produk").fetchone()[0] == 15
+
+
+def test_impor_kedaluwarsa_salah_format_dilewati(conn):
+    with conn:
+        stok.tambah_produk(conn, 'Susu', 'Pcs', 0)
+    path = database.path_data(tugas.DIR_IMPOR, 'masuk-kedaluwarsa.csv')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write("produk,jumlah,tanggal,batch,kedaluwarsa\n"
+                "Susu,4,2024-01-01,A,31/12/2024\n"
+                "Susu,5,2024-01-01,B,2024-12-31\n"
+                "Susu,6,2024-01-01,C,\n")
+    hasil = tugas.HANDLER['impor']({'jenis': 'masuk', 'path': path}, lambda *a: None)
+    assert (hasil['berhasil'], hasil['dilewati']) == (2, 1)
+    assert conn.execute("SELECT kode, kedaluwarsa, sisa FROM lot ORDER BY id").fetchall() == [
+        ('B', '2024-12-31', 5), ('C', None, 6)]
+
+
+def test_impor_tanggal_kosong_dan_salah_format(conn):
+    with conn:
+        stok.tambah_produk(conn, 'Beras', 'Kg', 100)
+    path = database.path_data(tugas.DIR_IMPOR, 'keluar-tanggal.csv')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write("produk,jumlah,tanggal\nBeras,4,\nBeras,5,05/02/2024\nBeras,6,2024-02-05\n")
+    hasil = tugas.HANDLER['impor']({'jenis': 'keluar', 'path': path}, lambda *a: None)
+    assert (hasil['berhasil'], hasil['dilewati']) == (2, 1)
+    hari_ini = pd.Timestamp.now().strftime('%Y-%m-%d')
+    assert conn.execute("SELECT tanggal, jumlah FROM transaksi_keluar ORDER BY id").fetchall() == [
+        (hari_ini, 4), ('2024-02-05', 6)]
+
+    at = halaman('transaksi_keluar')
+    at.run()
+    assert not at.exception
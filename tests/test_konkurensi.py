@@ -0,0 +1,122 @@
+import gzip
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cadangan
+import database
+import stok
+import tugas
+
+PENULIS = 8
+
+
+def jalankan_bersamaan(fungsi, n=PENULIS):
+    # Jalankan fungsi(i) di n thread yang dimulai serentak
+    mulai = threading.Barrier(n)
+
+    def _jalan(i):
+        mulai.wait()
+        return fungsi(i)
+
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        return list(pool.map(_jalan, range(n)))
+
+
+def test_penulis_bersamaan_menjaga_saldo(conn):
+    with conn:
+        lok2 = conn.execute("INSERT INTO lokasi (nama) VALUES ('Toko')").lastrowid
+        pid = stok.tambah_produk(conn, 'Beras', 'Kg', 1000)
+
+    def _penulis(i):
+        c = database.koneksi(timeout=30)
+        try:
+            for j in range(25):
+                with c:
+                    stok.catat_masuk(c, pid, 3, '2024-01-01', kode=f"T{i}-{j}")
+                with c:
+                    stok.catat_keluar(c, pid, 2, '2024-01-02')
+                with c:
+                    stok.transfer(c, pid, 1, lok2, 1, '2024-01-03')
+        finally:
+            c.close()
+
+    jalankan_bersamaan(_penulis)
+    n = PENULIS * 25
+    assert conn.execute("SELECT stok FROM produk").fetchone()[0] == 1000 + n
+    assert stok.stok_di(conn, pid, 1) == 1000
+    assert stok.stok_di(conn, pid, lok2) == n
+    assert conn.execute("SELECT COUNT(*) FROM transaksi_masuk").fetchone()[0] == n
+    assert conn.execute("SELECT COUNT(*) FROM transaksi_keluar").fetchone()[0] == n
+    assert conn.execute("SELECT SUM(sisa) FROM lot").fetchone()[0] == 1000 + n
+
+
+def test_penulis_bersamaan_tidak_menjual_melebihi_stok(conn):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Beras', 'Kg', 100)
+
+    def _penulis(i):
+        c = database.koneksi(timeout=30)
+        berhasil = 0
+        try:
+            for _ in range(20):
+                try:
+                    with c:
+                        stok.catat_keluar(c, pid, 1, '2024-01-02')
+                    berhasil += 1
+                except ValueError:
+                    pass
+        finally:
+            c.close()
+        return berhasil
+
+    assert sum(jalankan_bersamaan(_penulis)) == 100
+    assert conn.execute("SELECT stok FROM produk").fetchone()[0] == 0
+    assert stok.stok_di(conn, pid, 1) == 0
+    assert conn.execute("SELECT SUM(jumlah) FROM alokasi_lot").fetchone()[0] == 100
+
+
+def test_kirim_tugas_bersamaan_dideduplikasi(db, monkeypatch):
+    lanjut = threading.Event()
+    monkeypatch.setitem(tugas.HANDLER, 'uji', lambda params, progres: lanjut.wait(30))
+    try:
+        ids = jalankan_bersamaan(lambda i: tugas.kirim('uji', kunci='uji'))
+        assert len(set(ids)) == 1
+    finally:
+        lanjut.set()
+
+
+def test_cadangan_saat_ada_penulis(conn):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Beras', 'Kg', 0)
+    berhenti = threading.Event()
+
+    def _penulis():
+        c = database.koneksi(timeout=30)
+        try:
+            while not berhenti.is_set():
+                with c:
+                    stok.catat_masuk(c, pid, 1, '2024-01-01')
+        finally:
+            c.close()
+
+    thread = threading.Thread(target=_penulis)
+    thread.start()
+    try:
+        hasil = cadangan.buat_cadangan()
+    finally:
+        berhenti.set()
+        thread.join()
+
+    path = database.path_data(cadangan.DIR_CADANGAN, hasil['nama'])
+    salinan = database.path_data('salinan.db')
+    with gzip.open(path, 'rb') as f_in, open(salinan, 'wb') as f_out:
+        f_out.write(f_in.read())
+    snap = sqlite3.connect(salinan)
+    try:
+        assert snap.execute("PRAGMA integrity_check").fetchone()[0] == 'ok'
+        total, masuk = snap.execute(
+            "SELECT stok, (SELECT COUNT(*) FROM transaksi_masuk) FROM produk").fetchone()
+        assert total == masuk
+    finally:
+        snap.close()
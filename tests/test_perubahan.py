@@ -0,0 +1,128 @@
+import sqlite3
+
+import pytest
+
+import cadangan
+import database
+import perubahan
+import stok
+from conftest import halaman
+from test_konkurensi import jalankan_bersamaan
+
+
+def test_mutasi_tercatat_dalam_urutan(conn):
+    with conn:
+        lok2 = stok.tambah_lokasi(conn, 'Toko', pengguna='ani')
+        pid = stok.tambah_produk(conn, 'Susu', 'Pcs', 5, pengguna='ani')
+        masuk = stok.catat_masuk(conn, pid, 10, '2024-01-01', kode='A',
+                                 kedaluwarsa='2024-06-01', pengguna='budi')
+        keluar = stok.catat_keluar(conn, pid, 12, '2024-01-02', pengguna='budi')
+        stok.transfer(conn, pid, 1, lok2, 3, '2024-01-03', pengguna='budi')
+    log = perubahan.sejak(conn)
+    assert [(p['tabel'], p['entitas_id'], p['pengguna']) for p in log] == [
+        ('lokasi', lok2, 'ani'), ('produk', pid, 'ani'),
+        ('transaksi_masuk', masuk, 'budi'), ('transaksi_keluar', keluar, 'budi'),
+        ('transfer_stok', 1, 'budi')]
+    assert [p['seq'] for p in log] == sorted(p['seq'] for p in log)
+    assert log[2]['data']['kedaluwarsa'] == '2024-06-01'
+    assert sum(j for _, j in log[3]['data']['alokasi']) == 12
+    assert perubahan.seq_terakhir(conn) == log[-1]['seq']
+
+
+def test_mutasi_gagal_tidak_tercatat(conn):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Susu', 'Pcs', 1)
+    sebelum = perubahan.seq_terakhir(conn)
+    with pytest.raises(ValueError):
+        with conn:
+            stok.catat_masuk(conn, pid, 5, '2024-01-01')
+            stok.catat_keluar(conn, pid, 100, '2024-01-02')
+    # Transaksi dibatalkan seluruhnya, termasuk baris log dari catat_masuk
+    assert perubahan.seq_terakhir(conn) == sebelum
+
+
+def test_log_hanya_dapat_ditambah(conn):
+    with conn:
+        stok.tambah_produk(conn, 'Susu', 'Pcs', 1)
+    with pytest.raises(sqlite3.IntegrityError):
+        with conn:
+            conn.execute("UPDATE log_perubahan SET pengguna = 'x'")
+    with pytest.raises(sqlite3.IntegrityError):
+        with conn:
+            conn.execute("DELETE FROM log_perubahan")
+
+
+def test_sejak_dan_alirkan(conn):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Susu', 'Pcs', 0)
+        for i in range(7):
+            stok.catat_masuk(conn, pid, 1, '2024-01-01')
+        stok.catat_keluar(conn, pid, 2, '2024-01-02')
+    semua = [p['seq'] for p in perubahan.sejak(conn)]
+    assert [p['seq'] for p in perubahan.sejak(conn, semua[3])] == semua[4:]
+    assert [p['seq'] for p in perubahan.alirkan(semua[1], ukuran=3)] == semua[2:]
+    keluar = list(perubahan.alirkan(tabel='transaksi_keluar'))
+    assert [p['tabel'] for p in keluar] == ['transaksi_keluar']
+    assert list(perubahan.alirkan(semua[-1])) == []
+
+
+def test_seq_naik_dengan_penulis_bersamaan(conn):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Susu', 'Pcs', 0)
+
+    def _penulis(i):
+        c = database.koneksi(timeout=30)
+        try:
+            for _ in range(20):
+                with c:
+                    stok.catat_masuk(c, pid, 1, '2024-01-01', pengguna=f"penulis-{i}")
+        finally:
+            c.close()
+
+    jalankan_bersamaan(_penulis)
+    log = list(perubahan.alirkan(tabel='transaksi_masuk', ukuran=50))
+    assert len(log) == 8 * 20
+    seq = [p['seq'] for p in log]
+    assert seq == sorted(set(seq))
+    assert len({p['pengguna'] for p in log}) == 8
+
+
+def test_pulihkan_tidak_memundurkan_seq(conn):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Susu', 'Pcs', 0)
+    nama = cadangan.buat_cadangan()['nama']
+    with conn:
+        for _ in range(5):
+            stok.catat_masuk(conn, pid, 1, '2024-01-01')
+    sebelum = perubahan.seq_terakhir(conn)
+
+    cadangan.pulihkan(nama, pengguna='admin')
+    penanda = perubahan.sejak(conn, 0)[-1]
+    assert (penanda['tabel'], penanda['operasi'], penanda['pengguna']) == (
+        'database', 'pulihkan', 'admin')
+    assert penanda['seq'] > sebelum
+    assert penanda['data']['seq_sebelum'] == sebelum
+    # Konsumen yang berhenti di seq lama tetap menerima penanda pemulihan
+    assert [p['seq'] for p in perubahan.sejak(conn, sebelum, tabel='produk')] == [penanda['seq']]
+    with conn:
+        baru = stok.catat_masuk(conn, pid, 1, '2024-01-02')
+    assert perubahan.sejak(conn, penanda['seq'])[0]['entitas_id'] == baru
+
+
+def test_halaman_mencatat_pengguna(conn):
+    at = halaman('produk')
+    at.run()
+    next(t for t in at.text_input if t.label == "Nama Produk").set_value("Gula")
+    next(t for t in at.text_input if t.label == "Satuan").set_value("Kg")
+    next(b for b in at.button if b.label == "Tambah Produk").click()
+    at.run()
+    assert not at.exception
+    # Tanpa login Streamlit tidak ada pengguna terautentikasi yang dicatat
+    (log,) = perubahan.sejak(conn)
+    assert (log['tabel'], log['operasi'], log['pengguna']) == ('produk', 'tambah', None)
+
+    at = halaman('pemeliharaan')
+    at.run()
+    assert not at.exception
+    assert "📜 Log Perubahan" in [s.value for s in at.subheader]
+    assert any("login Streamlit" in c.value for c in at.caption)
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import stok
+from conftest import halaman, tunggu_tugas
+from diagnostik import acf_fft, adf_test, pacf_yw, versi_data
+from prediksi import data_bulanan, hitung_prediksi
+
+
+def seri_bulanan(nilai, mulai='2022-01-31'):
+    return pd.DataFrame({
+        'tanggal': pd.date_range(mulai, periods=len(nilai), freq='ME'),
+        'jumlah': nilai,
+    })
+
+
+def ar1(n, phi, seed):
+    rng = np.random.default_rng(seed)
+    x = np.zeros(n)
+    e = rng.normal(size=n)
+    for t in range(1, n):
+        x[t] = phi * x[t - 1] + e[t]
+    return x
+
+
+def test_data_bulanan_agregasi_per_lokasi(conn):
+    with conn:
+        lok2 = conn.execute("INSERT INTO lokasi (nama) VALUES ('Toko')").lastrowid
+        pid = stok.tambah_produk(conn, 'Beras', 'Kg', 100)
+        stok.transfer(conn, pid, 1, lok2, 50, '2024-01-01')
+        stok.catat_keluar(conn, pid, 3, '2024-01-05')
+        stok.catat_keluar(conn, pid, 4, '2024-01-20', lok2)
+        stok.catat_keluar(conn, pid, 5, '2024-03-02')
+    semua = data_bulanan(conn, pid)
+    assert list(semua['jumlah']) == [7, 0, 5]
+    assert list(semua['tanggal'].dt.strftime('%Y-%m-%d')) == ['2024-01-31', '2024-02-29', '2024-03-31']
+    assert list(data_bulanan(conn, pid, lok2)['jumlah']) == [4]
+    assert versi_data(conn, pid, lok2)[0] == 1
+
+
+def test_prediksi_seri_sintetis():
+    rng = np.random.default_rng(1)
+    t = np.arange(36)
+    nilai = 100 + 2 * t + 10 * np.sin(2 * np.pi * t / 12) + rng.normal(0, 2, 36)
+    hasil = hitung_prediksi(seri_bulanan(nilai))
+    assert hasil['terbaik'] is not None
+    assert np.isfinite(hasil['mse'])
+    assert all(np.isfinite(m['mse']) for m in hasil['model'] if 'mse' in m)
+    tanggal = pd.to_datetime([p['tanggal'] for p in hasil['prediksi']])
+    assert list(tanggal) == list(pd.date_range('2025-01-31', periods=12, freq='ME'))
+    prediksi = np.array([p['prediksi'] for p in hasil['prediksi']])
+    assert np.all((prediksi > nilai.min() - 50) & (prediksi < nilai.max() + 50))
+
+
+def test_prediksi_seri_pendek_tidak_gagal():
+    progres = []
+    hasil = hitung_prediksi(seri_bulanan([5, 7, 6]), lambda p, pesan: progres.append(p))
+    assert len(hasil['model']) == 3
+    assert progres == sorted(progres)
+
+
+def test_adf_membedakan_stasioner_dan_random_walk():
+    rng = np.random.default_rng(7)
+    assert adf_test(rng.normal(size=200))['p_value'] < 0.01
+    assert adf_test(np.cumsum(rng.normal(size=200)))['p_value'] > 0.05
+    assert adf_test(np.full(30, 4.0)) is None
+
+
+def test_acf_pacf_ar1():
+    x = ar1(2000, 0.7, seed=3)
+    acf, band = acf_fft(x, 10)
+    assert acf[0] == pytest.approx(1)
+    assert acf[1] == pytest.approx(0.7, abs=0.05)
+    assert acf[2] == pytest.approx(0.49, abs=0.07)
+    pacf, _ = pacf_yw(acf, len(x))
+    assert pacf[1] == pytest.approx(0.7, abs=0.05)
+    assert np.all(np.abs(pacf[2:]) < 0.1)
+    assert band[0] == 0 and np.all(band[1:] > 0)
+
+
+def test_halaman_prediksi_menampilkan_peramalan(conn):
+    nilai = 50 + 10 * np.sin(np.arange(24) / 2) + np.arange(24)
+    with conn:
+        pid = stok.tambah_produk(conn, 'Beras', 'Kg', 10_000)
+        for tanggal, jumlah in zip(pd.date_range('2022-01-10', periods=24, freq='MS'), nilai):
+            stok.catat_keluar(conn, pid, int(jumlah), tanggal.strftime('%Y-%m-%d'))
+    at = halaman('prediksi')
+    at.run()
+    assert not at.exception
+    kunci = f"prediksi:{pid}:None:{':'.join(map(str, versi_data(conn, pid)))}"
+    assert tunggu_tugas(kunci)['status'] == 'selesai'
+
+    at.toggle(key="diagnostik_prediksi").set_value(True)
+    at.run()
+    assert not at.exception
+    assert "Peramalan untuk 12 Bulan ke Depan" in [s.value for s in at.subheader]
+    assert len(at.dataframe[-1].value) == 12
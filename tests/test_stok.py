@@ -0,0 +1,133 @@
+import pytest
+
+import stok
+from database import LOKASI_UTAMA
+
+
+@pytest.fixture
+def gudang2(conn):
+    with conn:
+        return conn.execute("INSERT INTO lokasi (nama) VALUES ('Gudang 2')").lastrowid
+
+
+def saldo(conn, produk_id):
+    total = conn.execute("SELECT stok FROM produk WHERE id = ?", (produk_id,)).fetchone()[0]
+    per_lokasi = dict(conn.execute(
+        "SELECT lokasi_id, stok FROM stok_lokasi WHERE produk_id = ?", (produk_id,)))
+    return total, per_lokasi
+
+
+def cek_konsisten(conn):
+    # Total produk = jumlah saldo lokasi = jumlah sisa lot terbuka
+    assert conn.execute('''
+        SELECT COUNT(*) FROM produk p
+        WHERE p.stok != (SELECT COALESCE(SUM(stok), 0) FROM stok_lokasi WHERE produk_id = p.id)
+    ''').fetchone()[0] == 0
+    assert conn.execute('''
+        SELECT COUNT(*) FROM stok_lokasi sl
+        WHERE sl.stok != (SELECT COALESCE(SUM(sisa), 0) FROM lot
+                          WHERE produk_id = sl.produk_id AND lokasi_id = sl.lokasi_id)
+    ''').fetchone()[0] == 0
+
+
+def test_tambah_produk_dengan_stok_awal(conn):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Beras', 'Kg', 25)
+    assert saldo(conn, pid) == (25, {LOKASI_UTAMA: 25})
+    cek_konsisten(conn)
+
+
+def test_masuk_dan_keluar(conn):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Beras', 'Kg', 10)
+        stok.catat_masuk(conn, pid, 15, '2024-01-02')
+        stok.catat_keluar(conn, pid, 7, '2024-01-03')
+    assert saldo(conn, pid) == (18, {LOKASI_UTAMA: 18})
+    assert conn.execute("SELECT COUNT(*) FROM transaksi_masuk").fetchone()[0] == 1
+    assert conn.execute("SELECT COUNT(*) FROM transaksi_keluar").fetchone()[0] == 1
+    cek_konsisten(conn)
+
+
+def test_keluar_melebihi_stok_dibatalkan(conn):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Beras', 'Kg', 5)
+    with pytest.raises(ValueError):
+        with conn:
+            stok.catat_keluar(conn, pid, 6, '2024-01-03')
+    assert saldo(conn, pid) == (5, {LOKASI_UTAMA: 5})
+    assert conn.execute("SELECT COUNT(*) FROM transaksi_keluar").fetchone()[0] == 0
+
+
+def test_transfer_tidak_mengubah_total(conn, gudang2):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Beras', 'Kg', 20)
+        stok.transfer(conn, pid, LOKASI_UTAMA, gudang2, 8, '2024-01-03')
+        stok.catat_keluar(conn, pid, 3, '2024-01-04', gudang2)
+    assert saldo(conn, pid) == (17, {LOKASI_UTAMA: 12, gudang2: 5})
+    with pytest.raises(ValueError):
+        with conn:
+            stok.transfer(conn, pid, gudang2, gudang2, 1, '2024-01-05')
+    with pytest.raises(ValueError):
+        with conn:
+            stok.catat_keluar(conn, pid, 6, '2024-01-05', gudang2)
+    cek_konsisten(conn)
+
+
+def test_alokasi_fefo_lalu_fifo(conn):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Susu', 'Pcs', 0)
+        tanpa_exp = stok.catat_masuk(conn, pid, 10, '2024-01-01')
+        exp_akhir = stok.catat_masuk(conn, pid, 10, '2024-01-02', kode='B', kedaluwarsa='2024-12-31')
+        exp_awal = stok.catat_masuk(conn, pid, 10, '2024-01-03', kode='A', kedaluwarsa='2024-06-30')
+        keluar_id = stok.catat_keluar(conn, pid, 25, '2024-02-01')
+    lot = dict(conn.execute("SELECT masuk_id, id FROM lot WHERE produk_id = ?", (pid,)))
+    alokasi = dict(conn.execute(
+        "SELECT lot_id, jumlah FROM alokasi_lot WHERE keluar_id = ?", (keluar_id,)))
+    assert alokasi == {lot[exp_awal]: 10, lot[exp_akhir]: 10, lot[tanpa_exp]: 5}
+    assert [r[1] for r in stok.lot_terbuka(conn, pid, LOKASI_UTAMA)] == [None]
+    cek_konsisten(conn)
+
+
+def test_fefo_melewati_lot_kedaluwarsa(conn):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Susu', 'Pcs', 0)
+        stok.catat_masuk(conn, pid, 5, '2024-01-01', kode='A', kedaluwarsa='2024-01-10')
+        stok.catat_masuk(conn, pid, 5, '2024-01-02', kode='B', kedaluwarsa='2024-03-01')
+        keluar_id = stok.catat_keluar(conn, pid, 3, '2024-02-01')
+    kode = conn.execute("SELECT l.kode FROM alokasi_lot a JOIN lot l ON l.id = a.lot_id "
+                        "WHERE a.keluar_id = ?", (keluar_id,)).fetchall()
+    assert kode == [('B',)]
+    assert stok.stok_layak(conn, pid, LOKASI_UTAMA, '2024-02-01') == 2
+    # Sisa stok hanya lot kedaluwarsa: transaksi ditolak, saldo tidak berubah
+    with pytest.raises(ValueError), conn:
+        stok.catat_keluar(conn, pid, 4, '2024-02-01')
+    assert stok.stok_di(conn, pid, LOKASI_UTAMA) == 7
+
+    assert [r[1] for r in stok.lot_kedaluwarsa(conn, pid, LOKASI_UTAMA, '2024-02-01')] == ['A']
+    with conn:
+        assert stok.hapus_kedaluwarsa(conn, pid, LOKASI_UTAMA, '2024-02-01') == 5
+    assert stok.stok_di(conn, pid, LOKASI_UTAMA) == 2
+    assert conn.execute("SELECT stok FROM produk WHERE id = ?", (pid,)).fetchone()[0] == 2
+    assert conn.execute("SELECT COUNT(*) FROM transaksi_keluar").fetchone()[0] == 1
+    assert stok.lot_kedaluwarsa(conn, pid, LOKASI_UTAMA, '2024-02-01') == []
+    cek_konsisten(conn)
+
+
+def test_transfer_membawa_lot(conn, gudang2):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Susu', 'Pcs', 0)
+        stok.catat_masuk(conn, pid, 4, '2024-01-01', kode='A', kedaluwarsa='2024-03-01')
+        stok.catat_masuk(conn, pid, 4, '2024-01-02', kode='B', kedaluwarsa='2024-04-01')
+        stok.transfer(conn, pid, LOKASI_UTAMA, gudang2, 6, '2024-01-05')
+    tujuan = [(r[1], r[2], r[4]) for r in stok.lot_terbuka(conn, pid, gudang2)]
+    assert tujuan == [('A', '2024-03-01', 4), ('B', '2024-04-01', 2)]
+    cek_konsisten(conn)
+
+
+def test_lot_mendekati_kedaluwarsa(conn, gudang2):
+    with conn:
+        pid = stok.tambah_produk(conn, 'Susu', 'Pcs', 0)
+        stok.catat_masuk(conn, pid, 5, '2024-01-01', kode='LEWAT', kedaluwarsa='2000-01-01')
+        stok.catat_masuk(conn, pid, 5, '2024-01-01', gudang2, 'JAUH', '2999-01-01')
+    assert [r[3] for r in stok.lot_mendekati_kedaluwarsa(conn, 30)] == ['LEWAT']
+    assert stok.lot_mendekati_kedaluwarsa(conn, 30, gudang2) == []
@@ -0,0 +1,15 @@
+import tugas
+from conftest import tunggu_tugas
+
+
+def test_tugas_terputus_dilanjutkan_saat_mulai(conn, monkeypatch):
+    monkeypatch.setitem(tugas.HANDLER, 'uji', lambda params, progres: {'ok': True})
+    # Baris 'berjalan' peninggalan proses sebelumnya; pool belum dibuat
+    with conn:
+        conn.execute("INSERT INTO tugas (jenis, kunci, params, status, progres) "
+                     "VALUES ('uji', 'uji-terputus', '{}', 'berjalan', 0.4)")
+    monkeypatch.setattr(tugas, '_pool', None)
+    tugas.mulai()
+    info = tunggu_tugas('uji-terputus')
+    assert info['status'] == 'selesai'
+    assert info['hasil'] == {'ok': True}
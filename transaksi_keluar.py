@@ -1,17 +1,31 @@
 import streamlit as st
-import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta
 import pandas as pd
 import time
+from tugas import form_impor
+import arsip
+from stok import (catat_keluar, hapus_kedaluwarsa, lot_kedaluwarsa, lot_terbuka,
+                  pilih_lokasi, stok_layak)
+from perubahan import pengguna
+from database import koneksi
 
 
 def main():
     st.header("📤 Transaksi Keluar", divider="green")
-    conn = sqlite3.connect('data/stok.db')
+    conn = koneksi()
     c = conn.cursor()
 
-    # Ambil data produk
-    produk = c.execute("SELECT id, nama, stok FROM produk").fetchall()
+    # Lokasi asal barang keluar
+    lokasi_id = pilih_lokasi(
+        conn, key="lokasi_keluar", semua=False,
+        help="Lokasi asal barang yang dikeluarkan")
+
+    # Ambil data produk beserta stok di lokasi terpilih
+    produk = c.execute("""
+        SELECT p.id, p.nama, COALESCE(sl.stok, 0)
+        FROM produk p
+        LEFT JOIN stok_lokasi sl ON sl.produk_id = p.id AND sl.lokasi_id = ?
+    """, (lokasi_id,)).fetchall()
     if not produk:
         st.warning(
             "Tidak ada produk tersedia. Silakan tambah produk terlebih dahulu.", icon="⚠️")
@@ -31,13 +45,37 @@ def main():
         (p for p in produk if f"{p[1]} (Stok: {p[2]})" == produk_pilihan),
         None
     )
-    max_jumlah = selected_produk[2] if selected_produk else 0
+    # Batch kedaluwarsa tidak ikut dijual; tawarkan penghapusan terpisah
+    hari_ini = datetime.now().date()
+    max_jumlah = stok_layak(conn, selected_produk[0], lokasi_id, hari_ini) if selected_produk else 0
+    kedaluwarsa_lot = lot_kedaluwarsa(conn, selected_produk[0], lokasi_id, hari_ini) if selected_produk else []
+    if kedaluwarsa_lot:
+        total_kedaluwarsa = sum(l[3] for l in kedaluwarsa_lot)
+        st.warning(
+            f"{len(kedaluwarsa_lot)} batch ({total_kedaluwarsa:,}) sudah kedaluwarsa dan "
+            "tidak ikut dialokasikan untuk transaksi keluar.", icon="⚠️")
+        with st.expander("🗑️ Hapus Batch Kedaluwarsa"):
+            st.dataframe(
+                pd.DataFrame(
+                    [{'Batch': kode or '-',
+                      'Kedaluwarsa': pd.to_datetime(tgl).strftime('%d-%m-%Y'),
+                      'Sisa': sisa} for _, kode, tgl, sisa in kedaluwarsa_lot]),
+                use_container_width=True,
+                hide_index=True
+            )
+            yakin_hapus = st.checkbox(
+                "Saya mengerti stok batch ini akan dihapus dari persediaan",
+                key="yakin_hapus_kedaluwarsa")
+            if st.button("Hapus Batch Kedaluwarsa", disabled=not yakin_hapus):
+                with conn:
+                    hapus_kedaluwarsa(c, selected_produk[0], lokasi_id, hari_ini, pengguna())
+                st.rerun()
 
     # Input jumlah dengan validasi
     jumlah = st.number_input(
         "Jumlah",
         min_value=1,
-        max_value=max_jumlah,
+        max_value=max(max_jumlah, 1),
         step=1,
         help="Masukkan jumlah barang keluar"
     )
@@ -54,6 +92,30 @@ def main():
         elif jumlah > max_jumlah:
             st.error("Jumlah melebihi stok!", icon="❌")
 
+        # Pratinjau alokasi batch (FEFO, lalu FIFO untuk barang tanpa kedaluwarsa)
+        rencana = []
+        kebutuhan = jumlah
+        for _, kode, kedaluwarsa, tgl_lot, sisa in lot_terbuka(conn, selected_produk[0], lokasi_id,
+                                                               hari_ini):
+            if kebutuhan <= 0:
+                break
+            ambil = min(sisa, kebutuhan)
+            kebutuhan -= ambil
+            rencana.append({
+                'Batch': kode or '-',
+                'Kedaluwarsa': pd.to_datetime(kedaluwarsa).strftime('%d-%m-%Y') if kedaluwarsa else '-',
+                'Diterima': pd.to_datetime(tgl_lot).strftime('%d-%m-%Y') if tgl_lot else '-',
+                'Diambil': ambil,
+                'Sisa Batch': sisa - ambil
+            })
+        if rencana:
+            with st.expander(f"🏷️ Batch yang akan diambil ({len(rencana)})"):
+                st.dataframe(
+                    pd.DataFrame(rencana).style.format({'Diambil': '{:,}', 'Sisa Batch': '{:,}'}),
+                    use_container_width=True,
+                    hide_index=True
+                )
+
     # Form untuk finalisasi transaksi
     with st.form("tambah_keluar_form", border=True):
         st.subheader("📅 Detail Transaksi")
@@ -78,25 +140,55 @@ def main():
                 time.sleep(1)
                 try:
                     with conn:
-                        c.execute("INSERT INTO transaksi_keluar (produk_id, jumlah, tanggal) VALUES (?, ?, ?)",
-                                  (selected_produk[0], jumlah, tanggal))
-                        c.execute("UPDATE produk SET stok = stok - ? WHERE id = ?",
-                                  (jumlah, selected_produk[0]))
+                        catat_keluar(c, selected_produk[0], jumlah, tanggal, lokasi_id, pengguna())
                     st.success('Transaksi berhasil!', icon="✅")
                     st.session_state.page_keluar = 1
                     st.rerun()
                 except Exception as e:
                     st.error(f"Error: {str(e)}", icon="❌")
 
+    # Impor massal berjalan di latar belakang
+    form_impor('keluar')
+
+    # Filter Periode (arsip tahunan ikut dibaca bila periode mencakupnya)
+    hari_ini = datetime.now().date()
+    tanggal_awal, tanggal_akhir = c.execute(
+        "SELECT MIN(tanggal), MAX(tanggal) FROM transaksi_keluar").fetchone()
+    awal_default = pd.to_datetime(tanggal_awal).date() if tanggal_awal else hari_ini
+    akhir_default = max(pd.to_datetime(tanggal_akhir).date(), hari_ini) if tanggal_akhir else hari_ini
+    col_periode, col_lokasi = st.columns([3, 1])
+    with col_periode:
+        periode = st.date_input(
+            "Periode Riwayat",
+            value=(awal_default, akhir_default),
+            key="periode_keluar",
+            help="Transaksi sebelum periode data utama dibaca dari arsip"
+        )
+    with col_lokasi:
+        lokasi_riwayat = pilih_lokasi(conn, key="lokasi_riwayat_keluar")
+    mulai, akhir = (periode[0], periode[-1]) if periode else (awal_default, akhir_default)
+    mulai, dipotong = arsip.batasi_rentang(conn, mulai, akhir)
+    if dipotong:
+        st.info(f"Riwayat dibatasi {arsip.MAKS_TAHUN_ARSIP} tahun arsip, mulai {mulai:%d-%m-%Y}.",
+                icon="ℹ️")
+    sumber_keluar = arsip.sumber(conn, 'transaksi_keluar', mulai, akhir)
+    filter_riwayat = "tanggal >= ? AND tanggal < ?"
+    params_riwayat = (mulai.isoformat(), (akhir + timedelta(days=1)).isoformat())
+    if lokasi_riwayat is not None:
+        filter_riwayat += " AND lokasi_id = ?"
+        params_riwayat += (lokasi_riwayat,)
+
     # Tampilkan riwayat transaksi
     items_per_page = 5
     page_number = st.session_state.get('page_keluar', 1)
-    offset = (page_number - 1) * items_per_page
 
     total_transaksi = c.execute(
-        "SELECT COUNT(*) FROM transaksi_keluar").fetchone()[0]
+        f"SELECT COUNT(*) FROM {sumber_keluar} WHERE {filter_riwayat}",
+        params_riwayat).fetchone()[0]
     total_pages = (total_transaksi // items_per_page) + \
         (1 if total_transaksi % items_per_page > 0 else 0)
+    page_number = min(page_number, max(total_pages, 1))
+    offset = (page_number - 1) * items_per_page
 
     # Pagination Controls
     with st.container():
@@ -108,14 +200,14 @@ def main():
         with col_info:
             st.write(f"Halaman {page_number} dari {total_pages}")
         with col_next:
-            if st.button("Selanjutnya ➡️", disabled=(page_number == total_pages), key="next_keluar"):
+            if st.button("Selanjutnya ➡️", disabled=(page_number >= total_pages), key="next_keluar"):
                 st.session_state.page_keluar = page_number + 1
                 st.rerun()
         with col_jump:
             new_page = st.number_input(
                 "Lompat ke halaman",
                 min_value=1,
-                max_value=total_pages,
+                max_value=max(total_pages, 1),
                 value=page_number,
                 step=1,
                 key="jump_keluar"
@@ -125,22 +217,25 @@ def main():
                 st.rerun()
 
     # Tampilkan Data Transaksi
-    transaksi = c.execute("""
+    transaksi = c.execute(f"""
         SELECT 
             tk.id,
             p.nama AS Produk,
             tk.jumlah AS Jumlah,
-            strftime('%d-%m-%Y', tk.tanggal) AS Tanggal
-        FROM transaksi_keluar tk
+            strftime('%d-%m-%Y', tk.tanggal) AS Tanggal,
+            l.nama AS Lokasi
+        FROM (SELECT * FROM {sumber_keluar} WHERE {filter_riwayat}) tk
         JOIN produk p ON tk.produk_id = p.id
+        JOIN lokasi l ON tk.lokasi_id = l.id
+        ORDER BY tk.id
         LIMIT ? OFFSET ?
-    """, (items_per_page, offset)).fetchall()
+    """, params_riwayat + (items_per_page, offset)).fetchall()
 
     if not transaksi:
-        st.info("Tidak ada riwayat transaksi keluar.", icon="텅")
+        st.info("Tidak ada riwayat transaksi keluar.", icon="📭")
     else:
         df_transaksi = pd.DataFrame(
-            transaksi, columns=["ID", "Produk", "Jumlah", "Tanggal"])
+            transaksi, columns=["ID", "Produk", "Jumlah", "Tanggal", "Lokasi"])
 
         # Styling Tabel
         styled_df = df_transaksi.style \
@@ -159,7 +254,8 @@ def main():
                     format="%d",
                     help="Jumlah barang keluar"
                 ),
-                "Tanggal": "Tanggal Transaksi"
+                "Tanggal": "Tanggal Transaksi",
+                "Lokasi": "Lokasi"
             }
         )
 
@@ -1,13 +1,17 @@
 import streamlit as st
-import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta
 import pandas as pd
 import time
+from tugas import form_impor
+import arsip
+from stok import catat_masuk, pilih_lokasi
+from perubahan import pengguna
+from database import koneksi
 
 
 def main():
     st.header("📥 Transaksi Masuk", divider="green")
-    conn = sqlite3.connect('data/stok.db')
+    conn = koneksi()
     c = conn.cursor()
 
     # Form Tambah Transaksi
@@ -37,11 +41,30 @@ def main():
                 step=1,
                 help="Masukkan jumlah barang masuk"
             )
-        tanggal = st.date_input(
-            "Tanggal Transaksi",
-            value=datetime.now(),
-            help="Pilih tanggal transaksi"
-        )
+        col3, col4 = st.columns([3, 1])
+        with col3:
+            tanggal = st.date_input(
+                "Tanggal Transaksi",
+                value=datetime.now(),
+                help="Pilih tanggal transaksi"
+            )
+        with col4:
+            lokasi_id = pilih_lokasi(
+                conn, key="lokasi_masuk", semua=False,
+                help="Lokasi penerimaan barang")
+        col5, col6 = st.columns([3, 1])
+        with col5:
+            kode_batch = st.text_input(
+                "Kode Batch",
+                placeholder="Opsional, contoh: LOT-2024-001",
+                help="Kode batch/lot dari pemasok"
+            )
+        with col6:
+            kedaluwarsa = st.date_input(
+                "Tanggal Kedaluwarsa",
+                value=None,
+                help="Kosongkan untuk barang yang tidak kedaluwarsa"
+            )
 
         submitted = st.form_submit_button("Tambah Transaksi", type="primary")
 
@@ -51,26 +74,57 @@ def main():
                 produk_id = [p[0] for p in produk if p[1] == produk_pilihan][0]
                 try:
                     with conn:
-                        c.execute("INSERT INTO transaksi_masuk (produk_id, jumlah, tanggal) VALUES (?, ?, ?)",
-                                  (produk_id, jumlah, tanggal))
-                        c.execute("UPDATE produk SET stok = stok + ? WHERE id = ?",
-                                  (jumlah, produk_id))
+                        catat_masuk(c, produk_id, jumlah, tanggal, lokasi_id,
+                                    kode_batch, kedaluwarsa, pengguna())
                     st.success('Transaksi berhasil!', icon="✅")
                     st.session_state.page_masuk = 1
                     st.rerun()
                 except Exception as e:
                     st.error(f"Error: {str(e)}", icon="❌")
 
+    # Impor massal berjalan di latar belakang
+    form_impor('masuk')
+
+    # Filter Periode (arsip tahunan ikut dibaca bila periode mencakupnya)
+    hari_ini = datetime.now().date()
+    tanggal_awal, tanggal_akhir = c.execute(
+        "SELECT MIN(tanggal), MAX(tanggal) FROM transaksi_masuk").fetchone()
+    awal_default = pd.to_datetime(tanggal_awal).date() if tanggal_awal else hari_ini
+    akhir_default = max(pd.to_datetime(tanggal_akhir).date(), hari_ini) if tanggal_akhir else hari_ini
+    col_periode, col_lokasi = st.columns([3, 1])
+    with col_periode:
+        periode = st.date_input(
+            "Periode Riwayat",
+            value=(awal_default, akhir_default),
+            key="periode_masuk",
+            help="Transaksi sebelum periode data utama dibaca dari arsip"
+        )
+    with col_lokasi:
+        lokasi_riwayat = pilih_lokasi(conn, key="lokasi_riwayat_masuk")
+    mulai, akhir = (periode[0], periode[-1]) if periode else (awal_default, akhir_default)
+    mulai, dipotong = arsip.batasi_rentang(conn, mulai, akhir)
+    if dipotong:
+        st.info(f"Riwayat dibatasi {arsip.MAKS_TAHUN_ARSIP} tahun arsip, mulai {mulai:%d-%m-%Y}.",
+                icon="ℹ️")
+    sumber_masuk = arsip.sumber(conn, 'transaksi_masuk', mulai, akhir)
+    filter_riwayat = "tanggal >= ? AND tanggal < ?"
+    params_riwayat = (mulai.isoformat(), (akhir + timedelta(days=1)).isoformat())
+    if lokasi_riwayat is not None:
+        filter_riwayat += " AND lokasi_id = ?"
+        params_riwayat += (lokasi_riwayat,)
+
     # Pagination
     items_per_page = 5
     page_number = st.session_state.get('page_masuk', 1)
-    offset = (page_number - 1) * items_per_page
 
     # Hitung total data
     total_transaksi = c.execute(
-        "SELECT COUNT(*) FROM transaksi_masuk").fetchone()[0]
+        f"SELECT COUNT(*) FROM {sumber_masuk} WHERE {filter_riwayat}",
+        params_riwayat).fetchone()[0]
     total_pages = (total_transaksi // items_per_page) + \
         (1 if total_transaksi % items_per_page > 0 else 0)
+    page_number = min(page_number, max(total_pages, 1))
+    offset = (page_number - 1) * items_per_page
 
     # Pagination Controls
     with st.container():
@@ -82,14 +136,14 @@ def main():
         with col_info:
             st.write(f"Halaman {page_number} dari {total_pages}")
         with col_next:
-            if st.button("Selanjutnya ➡️", disabled=(page_number == total_pages), key="next_masuk"):
+            if st.button("Selanjutnya ➡️", disabled=(page_number >= total_pages), key="next_masuk"):
                 st.session_state.page_masuk = page_number + 1
                 st.rerun()
         with col_jump:
             new_page = st.number_input(
                 "Lompat ke halaman",
                 min_value=1,
-                max_value=total_pages,
+                max_value=max(total_pages, 1),
                 value=page_number,
                 step=1,
                 key="jump_masuk"
@@ -99,22 +153,25 @@ def main():
                 st.rerun()
 
     # Tampilkan Data Transaksi
-    transaksi = c.execute("""
+    transaksi = c.execute(f"""
         SELECT 
             tm.id,
             p.nama AS Produk,
             tm.jumlah AS Jumlah,
-            strftime('%d-%m-%Y', tm.tanggal) AS Tanggal
-        FROM transaksi_masuk tm
+            strftime('%d-%m-%Y', tm.tanggal) AS Tanggal,
+            l.nama AS Lokasi
+        FROM (SELECT * FROM {sumber_masuk} WHERE {filter_riwayat}) tm
         JOIN produk p ON tm.produk_id = p.id
+        JOIN lokasi l ON tm.lokasi_id = l.id
+        ORDER BY tm.id
         LIMIT ? OFFSET ?
-    """, (items_per_page, offset)).fetchall()
+    """, params_riwayat + (items_per_page, offset)).fetchall()
 
     if not transaksi:
-        st.info("Tidak ada riwayat transaksi masuk.", icon="텅")
+        st.info("Tidak ada riwayat transaksi masuk.", icon="📭")
     else:
         df_transaksi = pd.DataFrame(
-            transaksi, columns=["ID", "Produk", "Jumlah", "Tanggal"])
+            transaksi, columns=["ID", "Produk", "Jumlah", "Tanggal", "Lokasi"])
 
         # Styling Tabel
         styled_df = df_transaksi.style \
@@ -133,7 +190,8 @@ def main():
                     format="%d",
                     help="Jumlah barang masuk"
                 ),
-                "Tanggal": "Tanggal Transaksi"
+                "Tanggal": "Tanggal Transaksi",
+                "Lokasi": "Lokasi"
             }
         )
 
@@ -0,0 +1,347 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import streamlit as st
+
+import arsip
+import cadangan
+import perubahan
+import stok
+from database import koneksi, path_data
+
+DIR_IMPOR = 'impor'
+MAX_WORKER = 2
+UKURAN_BATCH = 500
+STATUS_AKTIF = ('antri', 'berjalan')
+
+HANDLER = {}
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def daftarkan(jenis):
+    # Dekorator untuk mendaftarkan fungsi pengerja sebuah jenis tugas
+    def _daftar(fungsi):
+        HANDLER[jenis] = fungsi
+        return fungsi
+    return _daftar
+
+
+def _koneksi():
+    return koneksi(timeout=30)
+
+
+def _dapatkan_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=MAX_WORKER, thread_name_prefix="mstock-tugas")
+            # Tugas yang terputus (mis. server restart) diantrikan ulang
+            conn = _koneksi()
+            with conn:
+                conn.execute(
+                    "UPDATE tugas SET status = 'antri' WHERE status = 'berjalan'")
+                sisa = [r[0] for r in conn.execute(
+                    "SELECT id FROM tugas WHERE status = 'antri' ORDER BY id")]
+            conn.close()
+            for tugas_id in sisa:
+                _pool.submit(_kerjakan, tugas_id)
+        return _pool
+
+
+def mulai():
+    # Dipanggil saat aplikasi mulai: tugas yang terputus oleh restart langsung
+    # dilanjutkan, tidak menunggu kirim() pertama
+    _dapatkan_pool()
+
+
+def kirim(jenis, params=None, kunci=None):
+    # Masukkan tugas ke antrian; tugas identik yang masih aktif dipakai ulang
+    if jenis not in HANDLER:
+        raise ValueError(f"Jenis tugas tidak dikenal: {jenis}")
+    params = params or {}
+    if kunci is None:
+        kunci = f"{jenis}:{json.dumps(params, sort_keys=True)}"
+    pool = _dapatkan_pool()
+    conn = _koneksi()
+    try:
+        while True:
+            try:
+                with conn:
+                    cur = conn.execute(
+                        "INSERT INTO tugas (jenis, kunci, params) VALUES (?, ?, ?)",
+                        (jenis, kunci, json.dumps(params)))
+                tugas_id = cur.lastrowid
+                break
+            except sqlite3.IntegrityError:
+                aktif = conn.execute(
+                    "SELECT id FROM tugas WHERE kunci = ? AND status IN (?, ?)",
+                    (kunci,) + STATUS_AKTIF).fetchone()
+                if aktif:
+                    return aktif[0]
+                # Tugas aktif baru saja selesai, coba masukkan lagi
+    finally:
+        conn.close()
+    pool.submit(_kerjakan, tugas_id)
+    return tugas_id
+
+
+def _kerjakan(tugas_id):
+    conn = _koneksi()
+    try:
+        with conn:
+            diambil = conn.execute(
+                "UPDATE tugas SET status = 'berjalan', dimulai = CURRENT_TIMESTAMP "
+                "WHERE id = ? AND status = 'antri'", (tugas_id,)).rowcount
+        if not diambil:
+            return
+        jenis, params = conn.execute(
+            "SELECT jenis, params FROM tugas WHERE id = ?", (tugas_id,)).fetchone()
+
+        def progres(nilai, pesan=None):
+            with conn:
+                conn.execute(
+                    "UPDATE tugas SET progres = ?, pesan = COALESCE(?, pesan) WHERE id = ?",
+                    (min(max(float(nilai), 0.0), 1.0), pesan, tugas_id))
+
+        try:
+            hasil = HANDLER[jenis](json.loads(params or '{}'), progres)
+        except Exception as e:
+            with conn:
+                conn.execute(
+                    "UPDATE tugas SET status = 'gagal', pesan = ?, selesai = CURRENT_TIMESTAMP "
+                    "WHERE id = ?", (str(e), tugas_id))
+        else:
+            with conn:
+                conn.execute(
+                    "UPDATE tugas SET status = 'selesai', progres = 1, hasil = ?, "
+                    "selesai = CURRENT_TIMESTAMP WHERE id = ?",
+                    (json.dumps(hasil), tugas_id))
+    finally:
+        conn.close()
+
+
+def _baris_ke_dict(cur, row):
+    if row is None:
+        return None
+    data = dict(zip([d[0] for d in cur.description], row))
+    data['params'] = json.loads(data['params'] or '{}')
+    data['hasil'] = json.loads(data['hasil']) if data['hasil'] else None
+    return data
+
+
+def status(tugas_id):
+    conn = _koneksi()
+    try:
+        cur = conn.execute("SELECT * FROM tugas WHERE id = ?", (tugas_id,))
+        return _baris_ke_dict(cur, cur.fetchone())
+    finally:
+        conn.close()
+
+
+def terakhir(kunci):
+    # Tugas terbaru dengan kunci yang sama (aktif maupun sudah selesai)
+    conn = _koneksi()
+    try:
+        cur = conn.execute(
+            "SELECT * FROM tugas WHERE kunci = ? ORDER BY id DESC LIMIT 1", (kunci,))
+        return _baris_ke_dict(cur, cur.fetchone())
+    finally:
+        conn.close()
+
+
+@st.fragment(run_every=1)
+def pantau(tugas_id):
+    # Tampilkan progres dan muat ulang halaman saat tugas selesai
+    mulai()
+    info = status(tugas_id)
+    if info is None or info['status'] not in STATUS_AKTIF:
+        st.rerun()
+    teks = info['pesan'] or (
+        "Menunggu giliran..." if info['status'] == 'antri' else "Memproses...")
+    st.progress(info['progres'], text=teks)
+
+
+def status_impor(jenis, sidik):
+    conn = _koneksi()
+    try:
+        row = conn.execute(
+            "SELECT baris, berhasil, dilewati, selesai FROM impor_berkas "
+            "WHERE jenis = ? AND sidik = ?", (jenis, sidik)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    return dict(zip(('baris', 'berhasil', 'dilewati', 'selesai'), row))
+
+
+def form_impor(jenis):
+    # Unggah CSV transaksi lalu proses sebagai tugas latar belakang
+    kunci_state = f"tugas_impor_{jenis}"
+    with st.expander("📄 Impor dari CSV"):
+        st.caption("Kolom: produk (nama produk), jumlah, tanggal (opsional, YYYY-MM-DD), "
+                   "lokasi (opsional, nama lokasi)"
+                   + (", batch dan kedaluwarsa (opsional, YYYY-MM-DD)" if jenis == 'masuk' else ""))
+        berkas = st.file_uploader("Pilih berkas CSV", type="csv", key=f"berkas_impor_{jenis}")
+        if berkas is not None and st.button("Mulai Impor", key=f"mulai_impor_{jenis}"):
+            isi = berkas.getvalue()
+            sidik = hashlib.sha1(isi).hexdigest()
+            riwayat = status_impor(jenis, sidik)
+            if riwayat and riwayat['selesai']:
+                st.warning(
+                    f"Berkas ini sudah diimpor pada {riwayat['selesai']} "
+                    f"({riwayat['berhasil']:,} baris berhasil).", icon="⚠️")
+            else:
+                # Impor yang sebelumnya gagal dilanjutkan dari baris terakhir yang tersimpan
+                os.makedirs(path_data(DIR_IMPOR), exist_ok=True)
+                path = path_data(DIR_IMPOR, f"{jenis}-{sidik}.csv")
+                with open(path, 'wb') as f:
+                    f.write(isi)
+                st.session_state[kunci_state] = kirim(
+                    'impor', {'jenis': jenis, 'path': path, 'pengguna': perubahan.pengguna()},
+                    kunci=f"impor:{jenis}:{sidik}")
+
+        tugas_id = st.session_state.get(kunci_state)
+        info = status(tugas_id) if tugas_id else None
+        if info is None:
+            return
+        if info['status'] in STATUS_AKTIF:
+            pantau(tugas_id)
+        elif info['status'] == 'selesai':
+            st.success(
+                f"Impor selesai: {info['hasil']['berhasil']:,} baris berhasil, "
+                f"{info['hasil']['dilewati']:,} dilewati.", icon="✅")
+        else:
+            st.error(f"Impor gagal: {info['pesan']}", icon="❌")
+
+
+# Pengerja Tugas
+
+@daftarkan('prediksi')
+def _tugas_prediksi(params, progres):
+    from prediksi import data_bulanan, hitung_prediksi
+    conn = _koneksi()
+    try:
+        df_monthly = data_bulanan(conn, params['produk_id'], params.get('lokasi_id'))
+    finally:
+        conn.close()
+    return hitung_prediksi(df_monthly, progres)
+
+
+@daftarkan('rekap_bulanan')
+def _tugas_rekap_bulanan(params, progres):
+    conn = _koneksi()
+    try:
+        progres(0.1, "Menghitung rekap bulanan...")
+        baris = arsip.perbarui_rekap(conn)
+    finally:
+        conn.close()
+    return {'baris': baris}
+
+
+@daftarkan('arsip')
+def _tugas_arsip(params, progres):
+    return arsip.arsipkan(params.get('bulan', 12), progres)
+
+
+@daftarkan('cadangan')
+def _tugas_cadangan(params, progres):
+    hasil = cadangan.buat_cadangan(progres)
+    hasil['terhapus'] = cadangan.bersihkan(params.get('retensi', cadangan.RETENSI))
+    return hasil
+
+
+def _tanggal_iso(nilai, kosong=None):
+    # Sel tanggal CSV -> 'YYYY-MM-DD'; sel kosong menjadi `kosong`, format lain
+    # (mis. 05/02/2024) ditolak agar urutan teks tanggal di database tetap benar
+    if pd.isna(nilai) or not str(nilai).strip():
+        return kosong
+    tanggal = pd.to_datetime(str(nilai).strip(), format='%Y-%m-%d', errors='coerce')
+    if pd.isna(tanggal):
+        raise ValueError(f"Tanggal tidak valid: {nilai}")
+    return tanggal.strftime('%Y-%m-%d')
+
+
+@daftarkan('impor')
+def _tugas_impor(params, progres):
+    # Impor CSV transaksi (kolom: produk, jumlah, tanggal, lokasi, batch,
+    # kedaluwarsa) secara bertahap; batch dan kedaluwarsa hanya untuk transaksi masuk.
+    # Posisi baris ikut di-commit per batch sehingga impor ulang melanjutkan,
+    # bukan menggandakan baris yang sudah masuk
+    jenis = params['jenis']
+    catat = {'masuk': stok.catat_masuk, 'keluar': stok.catat_keluar}[jenis]
+    pengguna = params.get('pengguna')
+    conn = None
+    try:
+        with open(params['path'], 'rb') as f:
+            sidik = hashlib.sha1(f.read()).hexdigest()
+        df = pd.read_csv(params['path'])
+        kolom_kurang = {'produk', 'jumlah'} - set(df.columns)
+        if kolom_kurang:
+            raise ValueError(f"Kolom wajib tidak ada: {', '.join(sorted(kolom_kurang))}")
+        hari_ini = pd.Timestamp.now().strftime('%Y-%m-%d')
+        for kolom in ('tanggal', 'lokasi', 'batch', 'kedaluwarsa'):
+            if kolom not in df.columns:
+                df[kolom] = None
+
+        conn = _koneksi()
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO impor_berkas (jenis, sidik) VALUES (?, ?)",
+                         (jenis, sidik))
+        awal, berhasil, dilewati, selesai = conn.execute(
+            "SELECT baris, berhasil, dilewati, selesai FROM impor_berkas "
+            "WHERE jenis = ? AND sidik = ?", (jenis, sidik)).fetchone()
+        if selesai:
+            return {'berhasil': berhasil, 'dilewati': dilewati, 'sudah_diimpor': True}
+
+        produk = {nama: pid for pid, nama in conn.execute("SELECT id, nama FROM produk")}
+        lokasi = {nama: lid for lid, nama in stok.daftar_lokasi(conn)}
+        total = len(df)
+        for mulai in range(awal, total, UKURAN_BATCH):
+            batch = df.iloc[mulai:mulai + UKURAN_BATCH]
+            with conn:
+                for row in batch.itertuples(index=False):
+                    produk_id = produk.get(str(row.produk))
+                    lokasi_id = (lokasi.get(str(row.lokasi)) if pd.notna(row.lokasi)
+                                 else stok.LOKASI_UTAMA)
+                    jumlah = int(row.jumlah) if pd.notna(row.jumlah) else 0
+                    if produk_id is None or lokasi_id is None or jumlah <= 0:
+                        dilewati += 1
+                        continue
+                    try:
+                        # Tanggal kosong berarti hari ini
+                        tanggal = _tanggal_iso(row.tanggal, hari_ini)
+                        if jenis == 'masuk':
+                            catat(conn, produk_id, jumlah, tanggal, lokasi_id,
+                                  str(row.batch) if pd.notna(row.batch) else None,
+                                  _tanggal_iso(row.kedaluwarsa), pengguna)
+                        else:
+                            catat(conn, produk_id, jumlah, tanggal, lokasi_id,
+                                  pengguna=pengguna)
+                    except ValueError:
+                        # Tanggal/kedaluwarsa tidak valid atau stok tidak mencukupi
+                        dilewati += 1
+                        continue
+                    berhasil += 1
+                sampai = min(mulai + UKURAN_BATCH, total)
+                conn.execute(
+                    "UPDATE impor_berkas SET baris = ?, berhasil = ?, dilewati = ? "
+                    "WHERE jenis = ? AND sidik = ?",
+                    (sampai, berhasil, dilewati, jenis, sidik))
+            progres(sampai / total, f"{sampai:,}/{total:,} baris diproses")
+        with conn:
+            conn.execute(
+                "UPDATE impor_berkas SET selesai = CURRENT_TIMESTAMP WHERE jenis = ? AND sidik = ?",
+                (jenis, sidik))
+        return {'berhasil': berhasil, 'dilewati': dilewati, 'dilanjutkan_dari': awal}
+    finally:
+        if conn is not None:
+            conn.close()
+        if os.path.exists(params['path']):
+            os.remove(params['path'])